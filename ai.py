@@ -0,0 +1,168 @@
+""" computer controlled paddles.
+The AI never simulate the ball tick by tick : where the ball will cross the
+paddle is solved in closed form, one straight segment per bounce on the
+ceiling and the floor, and only solved again when the ball direction change.
+Between two solves a tick cost a tuple compare, so thousands of headless
+matches or a slow machine can afford it.
+
+python ai.py [--difficulty normal] [--matches 20]  : AI against AI, headless
+"""
+from collections.abc import Sequence
+import argparse
+import math
+import random
+import time
+import settings
+from config import MatchConfig
+from entitys import Ball, Paddle
+from inputs import Action
+from prng import MatchRandom
+from simulation import Match
+
+# a ball going almost vertically bounce for ever, give up past that
+MAX_BOUNCES = 64
+# mixed in the seed of an AI, so its draws never repeat the ones of the match
+# it plays, often built from the same seed. Not the MatchRandom increment :
+# the seed 0 would give the draws of a match of seed 0, one draw ahead
+SEED_SALT = 0xD1B54A32D192ED03
+
+
+def intercept(
+    x: float,
+    y: float,
+    direction_x: float,
+    direction_y: float,
+    target_x: float,
+    bottom: float,
+) -> float:
+    """ top of the ball when its left reach target_x.
+    x, y is the top left of the ball, bottom the lowest top it can have.
+    The bounces are the ones of Ball.collide_with_walls : the vertical
+    direction is set to 1 or -1, then the direction is clamped to 1 long.
+    The ball must go toward target_x.
+    """
+    remaining = target_x - x
+    for _ in range(MAX_BOUNCES):
+        if direction_y == 0:
+            return y
+        # both move at the ball speed, it cancel out
+        to_target = remaining / direction_x
+        wall = 0.0 if direction_y < 0 else bottom
+        to_wall = (wall - y) / direction_y
+        if to_target <= to_wall:
+            return y + direction_y * to_target
+        remaining -= direction_x * to_wall
+        y = wall
+        direction_y = 1.0 if direction_y < 0 else -1.0
+        length = math.hypot(direction_x, direction_y)
+        if length > 1:
+            direction_x /= length
+            direction_y /= length
+    return y
+
+
+class PaddleAI:
+    """ drive a paddle like a player, return its actions every tick.
+    The target is the predicted crossing of the match ball, off by an aim
+    error, and the paddle react a few ticks late to every change of the
+    ball direction, both drawn from settings.AI_DIFFICULTIES.
+    With the ball going away, the paddle go back to the middle.
+    """
+    __slots__ = ('player', 'reaction', 'aim_error', 'rng', 'key', 'target', 'wait', 'action')
+
+    def __init__(self, player: int, difficulty: str = 'normal', seed: int | None = None) -> None:
+        self.player = player
+        parameters = settings.AI_DIFFICULTIES[difficulty]
+        self.reaction = parameters['reaction']
+        self.aim_error = parameters['aim_error']
+        self.rng = MatchRandom(random.randrange(2 ** 32) if seed is None else seed ^ SEED_SALT)
+
+        # what the target was solved for : the ball direction and the goals
+        self.key: tuple[float, float, int] | None = None
+        self.target = 0.0
+        self.wait = 0
+        self.action = 0
+
+    def __call__(self, match: Match) -> int:
+        ball = match.ball
+        paddle = match.paddles[self.player]
+        key = (ball.direction.x, ball.direction.y, match.score.left + match.score.right)
+        if key != self.key:
+            self.key = key
+            self.target = self.solve(ball, paddle, match.config)
+            self.target += self.rng.uniform(-1, 1) * self.aim_error * paddle.frect.height / 2
+            self.wait = round(self.reaction * self.rng.uniform(0.5, 1.5))
+
+        # still reacting, keep doing what it did
+        if self.wait > 0:
+            self.wait -= 1
+            return self.action
+
+        offset = self.target - paddle.frect.centery
+        if offset < -paddle.speed:
+            self.action = Action.UP
+        elif offset > paddle.speed:
+            self.action = Action.DOWN
+        else:
+            self.action = 0
+        return self.action
+
+    @staticmethod
+    def solve(ball: Ball, paddle: Paddle, config: MatchConfig) -> float:
+        """ the height the paddle center should go to """
+        frect = ball.frect
+        direction_x, direction_y = ball.direction
+        # the ball left when it touch the paddle face
+        if paddle.frect.centerx < config.width / 2:
+            target_x = paddle.frect.right
+            coming = direction_x < 0 and frect.left >= target_x
+        else:
+            target_x = paddle.frect.left - frect.width
+            coming = direction_x > 0 and frect.left <= target_x
+        if not coming:
+            return config.height / 2
+        top = intercept(
+            frect.left, frect.top, direction_x, direction_y, target_x, config.height - frect.height,
+        )
+        return top + frect.height / 2
+
+
+def play(
+    matches: int,
+    difficulties: Sequence[str],
+    max_ticks: int,
+) -> tuple[dict[str, int], int]:
+    """ AI against AI, return the wins by side and the ticks played """
+    wins = {'LEFT': 0, 'RIGHT': 0}
+    ticks = 0
+    for seed in range(matches):
+        match = Match(seed=seed)
+        players = [
+            PaddleAI(player, difficulty, seed=seed * 2 + player)
+            for player, difficulty in enumerate(difficulties)
+        ]
+        winner = match.run(players, max_ticks)
+        if winner is not None:
+            wins[winner] += 1
+        ticks += match.ticks
+    return wins, ticks
+
+
+def main() -> None:
+    """ play headless matches between two AI and time them """
+    parser = argparse.ArgumentParser(description='AI against AI, headless')
+    parser.add_argument('--left', default='normal', choices=settings.AI_DIFFICULTIES)
+    parser.add_argument('--right', default='normal', choices=settings.AI_DIFFICULTIES)
+    parser.add_argument('--matches', type=int, default=20)
+    parser.add_argument('--max-ticks', type=int, default=60 * 60 * 5, help='per match')
+    arguments = parser.parse_args()
+
+    start = time.perf_counter()
+    wins, ticks = play(arguments.matches, (arguments.left, arguments.right), arguments.max_ticks)
+    elapsed = time.perf_counter() - start
+    print(f'left {arguments.left} {wins["LEFT"]} - {wins["RIGHT"]} right {arguments.right}')
+    print(f'{ticks} ticks, {ticks / elapsed:.0f} ticks/s')
+
+
+if __name__ == '__main__':
+    main()
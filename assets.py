@@ -0,0 +1,286 @@
+""" global container of images and fonts.
+Everything is read from the disk once, converted once and shared.
+Converted images depend on the display, invalidate() rebuild them from
+the decoded files kept in memory, without touching the disk again.
+"""
+from collections import OrderedDict
+from typing import Any
+import io
+import queue
+import threading
+import pygame
+import settings
+import sound
+
+
+# decoded files, never invalidated
+_files: dict[str, pygame.Surface] = {}
+# converted (and scaled, rotated) images, keyed by path, size, colorkey and angle
+_images: dict[tuple[str, tuple[int, int] | None, str | None, float], pygame.Surface] = {}
+_fonts: dict[tuple[str, int], pygame.font.Font] = {}
+# glyph atlases by font and color, converted like the images
+_atlases: dict[tuple[pygame.font.Font, tuple[int, ...]], 'GlyphAtlas'] = {}
+
+
+def image(
+    path: str,
+    size: tuple[int, int] | None = None,
+    colorkey: str | None = None,
+    angle: float = 0,
+) -> pygame.Surface:
+    """ return the image converted to the display format.
+    Optionally scaled to size, with a colorkey and rotated by angle degrees.
+    Shared, don't draw on it.
+    """
+    key = (path, size, colorkey, angle)
+    surface = _images.get(key)
+    if surface is not None:
+        return surface
+
+    if path not in _files:
+        _files[path] = pygame.image.load(file=path)
+    surface = _files[path].convert()
+    if colorkey is not None:
+        surface.set_colorkey(colorkey)
+    if angle:
+        surface = pygame.transform.rotate(surface=surface, angle=angle)
+    if size is not None:
+        surface = pygame.transform.scale(surface=surface, size=size)
+
+    _images[key] = surface
+    return surface
+
+
+def font(path: str, size: int) -> pygame.font.Font:
+    """ return a shared font """
+    key = (path, size)
+    loaded = _fonts.get(key)
+    if loaded is None:
+        loaded = _fonts[key] = pygame.font.Font(path, size)
+    return loaded
+
+
+def _preloaded_images() -> list[tuple[str, dict[str, Any]]]:
+    """ every image the states need, with the arguments of image() """
+    return [
+        (settings.PADDLE_IMAGE, {'colorkey': settings.COLORKEY, 'angle': 90}),
+        (settings.BALL_IMAGE, {'colorkey': settings.COLORKEY}),
+        (settings.FIELD_IMAGE, {'size': (settings.WIDTH, settings.HEIGHT)}),
+    ]
+
+
+def preload() -> None:
+    """ load everything the states need, so state transitions never hit the disk.
+    The display must be set.
+    """
+    for path, arguments in _preloaded_images():
+        image(path, **arguments)
+    for path, size in settings.FONTS:
+        font(path, size)
+    glyphs(font(settings.BOLD_FONT_NAME, settings.SCORE_FONT_SIZE), settings.SCORE_COLOR)
+
+
+class Loader:
+    """ preload in the background.
+    A worker thread read and decode the files (images, sounds, fonts),
+    poll() is called from the main thread to convert them to the display
+    format and store them, a few at a time.
+    """
+
+    def __init__(self) -> None:
+        self.images = _preloaded_images()
+        self.fonts = sorted({path for path, _ in settings.FONTS})
+        self.sounds = dict(sound.FILES)
+        # start the mixer on this thread, the worker only decode
+        sound.service.start()
+
+        self.total = len(self.images) + len(self.fonts) + len(self.sounds)
+        self.loaded = 0
+        self.decoded: queue.Queue[tuple[str, str, Any]] = queue.Queue()
+
+        self.thread = threading.Thread(target=self._decode, daemon=True)
+        self.thread.start()
+
+    def _decode(self) -> None:
+        """ worker thread, never touch the display here """
+        try:
+            for path, _ in self.images:
+                self.decoded.put(('image', path, pygame.image.load(file=path)))
+            for name, path in self.sounds.items():
+                self.decoded.put(('sound', name, sound.service.start().load(path)))
+            for path in self.fonts:
+                with open(path, 'rb') as file:
+                    self.decoded.put(('font', path, file.read()))
+        except (pygame.error, OSError) as error:
+            # raised again by poll(), on the main thread
+            self.decoded.put(('error', '', error))
+
+    @property
+    def progress(self) -> float:
+        """ between 0 and 1 """
+        return self.loaded / self.total if self.total else 1.0
+
+    @property
+    def finished(self) -> bool:
+        """ True once everything is stored """
+        return self.loaded >= self.total
+
+    def poll(self, budget: int = 2) -> bool:
+        """ store at most budget decoded files, return True once finished """
+        for _ in range(budget):
+            try:
+                kind, name, data = self.decoded.get_nowait()
+            except queue.Empty:
+                break
+
+            match kind:
+                case 'error':
+                    raise data
+                case 'image':
+                    _files[name] = data
+                    for path, arguments in self.images:
+                        if path == name:
+                            image(path, **arguments)
+                case 'sound':
+                    sound.service.start().store(name, data)
+                case 'font':
+                    for path, size in settings.FONTS:
+                        if path == name:
+                            _fonts[(path, size)] = pygame.font.Font(io.BytesIO(data), size)
+            self.loaded += 1
+
+        return self.finished
+
+
+def invalidate() -> None:
+    """ drop the converted images, call it when the display change.
+    They are rebuilt from memory on the next use.
+    """
+    _images.clear()
+    _atlases.clear()
+    ball_rotations.clear()
+
+
+class RotationCache:
+    """ LRU of rotated images, keyed by image name and quantized angle.
+    One cache is shared by every entity using the same images,
+    the least recently used rotations are dropped past max_bytes.
+    """
+
+    def __init__(self, buckets: int, max_bytes: int) -> None:
+        self.buckets = buckets
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.images: OrderedDict[tuple[str, int], pygame.Surface] = OrderedDict()
+
+    def get(self, name: str, surface: pygame.Surface, angle: float) -> pygame.Surface:
+        """ surface rotated by angle (in degrees) rounded to the nearest bucket """
+        bucket = round(angle * self.buckets / 360) % self.buckets
+        key = (name, bucket)
+
+        rotated = self.images.get(key)
+        if rotated is not None:
+            self.images.move_to_end(key)
+            return rotated
+
+        rotated = pygame.transform.rotate(surface, bucket * 360 / self.buckets)
+        self.images[key] = rotated
+        self.bytes += rotated.get_width() * rotated.get_height() * rotated.get_bytesize()
+
+        # keep at least the new one
+        while self.bytes > self.max_bytes and len(self.images) > 1:
+            _, dropped = self.images.popitem(last=False)
+            self.bytes -= dropped.get_width() * dropped.get_height() * dropped.get_bytesize()
+        return rotated
+
+    def clear(self) -> None:
+        """ drop every rotation """
+        self.images.clear()
+        self.bytes = 0
+
+
+# shared by every ball
+ball_rotations = RotationCache(
+    buckets=settings.ROTATION_BUCKETS,
+    max_bytes=settings.ROTATION_CACHE_BYTES,
+)
+
+
+class GlyphAtlas:
+    """ every printable ascii character of a font in one color, rendered once
+    in a single surface. Text is drawn by blitting the glyphs one by one
+    instead of font.render, the others characters are rendered on first use.
+    """
+
+    CHARACTERS = ''.join(chr(code) for code in range(32, 127))
+
+    def __init__(self, font_: pygame.font.Font, color: pygame.typing.ColorLike) -> None:
+        self.font = font_
+        self.color = color
+        # where each glyph is in the atlas
+        self.areas: dict[str, pygame.Rect] = {}
+        self.extra: dict[str, pygame.Surface] = {}
+
+        # the glyphs are not antialiased, a colorkey blit faster than per pixel alpha
+        red, green, blue, _ = pygame.Color(color)
+        self.colorkey = pygame.Color(255 - red, 255 - green, 255 - blue)
+
+        rendered = [font_.render(character, False, color) for character in self.CHARACTERS]
+        self.height = max(glyph.height for glyph in rendered)
+        self.surface = self._blank((sum(glyph.width for glyph in rendered), self.height))
+        x = 0
+        for character, glyph in zip(self.CHARACTERS, rendered):
+            self.areas[character] = self.surface.blit(glyph, (x, 0))
+            x += glyph.width
+
+    def _blank(self, size: tuple[int, int]) -> pygame.Surface:
+        """ a transparent surface, in the display format once there is one """
+        surface = pygame.Surface(size)
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill(self.colorkey)
+        surface.set_colorkey(self.colorkey)
+        return surface
+
+    def _glyph(self, character: str) -> tuple[pygame.Surface, pygame.Rect | None]:
+        """ the surface and the area of a glyph """
+        area = self.areas.get(character)
+        if area is not None:
+            return self.surface, area
+        glyph = self.extra.get(character)
+        if glyph is None:
+            glyph = self.extra[character] = self.font.render(character, False, self.color)
+        return glyph, None
+
+    def size(self, text: str) -> tuple[int, int]:
+        """ size of the text drawn """
+        width = 0
+        for character in text:
+            surface, area = self._glyph(character)
+            width += area.width if area is not None else surface.width
+        return width, self.height
+
+    def blit(self, canvas: pygame.Surface, text: str, dest: tuple[float, float]) -> pygame.Rect:
+        """ draw the text with its top left at dest, return the area drawn on """
+        x, y = dest
+        drawn = pygame.Rect(round(x), round(y), 0, self.height)
+        for character in text:
+            surface, area = self._glyph(character)
+            drawn.union_ip(canvas.blit(surface, (x, y), area))
+            x += area.width if area is not None else surface.width
+        return drawn
+
+    def render(self, text: str) -> pygame.Surface:
+        """ a new surface with the text, like font.render """
+        surface = self._blank(self.size(text))
+        self.blit(surface, text, (0, 0))
+        return surface
+
+
+def glyphs(font_: pygame.font.Font, color: pygame.typing.ColorLike) -> GlyphAtlas:
+    """ return the shared atlas of a font in a color """
+    key = (font_, tuple(pygame.Color(color)))
+    atlas = _atlases.get(key)
+    if atlas is None:
+        atlas = _atlases[key] = GlyphAtlas(font_, color)
+    return atlas
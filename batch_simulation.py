@@ -0,0 +1,236 @@
+""" numpy version of the headless simulation core.
+Step N independent matches at once, for self-play and tuning sweeps.
+The physics are the same as entitys.Paddle.update and entitys.Ball.update
+(swept paddle collisions included), every branch of the per-object code is a mask here.
+"""
+import numpy as np
+from config import MatchConfig
+
+
+LEFT = 0
+RIGHT = 1
+
+
+class BatchMatch:  # pylint: disable=too-many-instance-attributes
+    """ N matches stored as structure of arrays.
+    Positions are the top left corners of the hitboxes, like FRect.x and FRect.y,
+    and stored in float32 like them, so a match stays identical to the same Match
+    """
+
+    def __init__(
+        self,
+        count: int,
+        seed: int | None = None,
+        config: MatchConfig | None = None,
+    ) -> None:
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+
+        # constants, read once like the entities do, every match share the config
+        config = MatchConfig.from_settings() if config is None else config
+        self.config = config
+        self.width = float(config.width)
+        self.height = float(config.height)
+        self.goal_top = config.goal_top
+        self.goal_bottom = config.goal_bottom
+        self.ball_speed = float(config.ball_speed)
+        self.paddle_speed = float(config.paddle_speed)
+        self.max_bounce_angle = float(config.max_bounce_angle)
+        self.paddle_w, self.paddle_h = (float(size) for size in config.paddle_size)
+        self.ball_w, self.ball_h = (float(size) for size in config.ball_size)
+
+        # paddles, x never change
+        self.paddle_x = np.array([
+            config.width / 10 - self.paddle_w / 2,
+            config.width * 0.9 - self.paddle_w / 2,
+        ], dtype=np.float32)
+        self.paddle_y = np.empty((count, 2), dtype=np.float32)
+
+        # balls
+        self.ball_x = np.empty(count, dtype=np.float32)
+        self.ball_y = np.empty(count, dtype=np.float32)
+        self.ball_dx = np.empty(count)
+        self.ball_dy = np.empty(count)
+
+        # score[:, LEFT] and score[:, RIGHT]
+        self.score = np.empty((count, 2), dtype=np.int32)
+        self.ticks = np.empty(count, dtype=np.int64)
+
+        # scratch buffers, reused every step to avoid allocations
+        self._mask = np.empty(count, dtype=bool)
+        self._other = np.empty(count, dtype=bool)
+        self._tmp = np.empty(count)
+
+        self.reset()
+
+    def reset(self, mask: np.ndarray | None = None) -> None:
+        """ put every match (or the masked ones) back to kick off """
+        where = slice(None) if mask is None else mask
+        size = self.count if mask is None else int(np.count_nonzero(mask))
+
+        self.paddle_y[where] = self.height / 2 - self.paddle_h / 2
+        self.ball_x[where] = self.width / 2 - self.ball_w / 2
+        self.ball_y[where] = self.height / 2 - self.ball_h / 2
+        self.ball_dx[where] = self.rng.choice([-1.0, 1.0], size=size)
+        self.ball_dy[where] = 0.0
+        self.score[where] = 0
+        self.ticks[where] = 0
+
+    @property
+    def done(self) -> np.ndarray:
+        """ mask of the matches where a side reached config.win_score """
+        return self.score.max(axis=1) >= self.config.win_score
+
+    def step(self, actions: np.ndarray, dt: float = 1.0) -> np.ndarray:
+        """ advance every match by one tick of length dt.
+        actions is a (N, 2) array of paddle directions : -1 up, 0 none, 1 down.
+        Return a (N,) int8 array : 1 when LEFT scored, -1 when RIGHT scored.
+        """
+        self._move_paddles(actions, dt)
+        self._move_balls(dt)
+        goals = self._collide_with_walls()
+
+        # normalize the directions longer than 1, with the sqrt of Vector2.magnitude
+        np.multiply(self.ball_dx, self.ball_dx, out=self._tmp)
+        self._tmp += self.ball_dy * self.ball_dy
+        np.sqrt(self._tmp, out=self._tmp)
+        np.greater(self._tmp, 1, out=self._mask)
+        if self._mask.any():
+            self.ball_dx[self._mask] /= self._tmp[self._mask]
+            self.ball_dy[self._mask] /= self._tmp[self._mask]
+
+        self.ticks += 1
+        return goals
+
+    def _move_paddles(self, actions: np.ndarray, dt: float) -> None:
+        """ move and clamp the paddles between the ceiling and the floor """
+        self.paddle_y += self.paddle_speed * dt * actions
+        np.clip(self.paddle_y, 0.0, self.height - self.paddle_h, out=self.paddle_y)
+
+    def _move_balls(self, dt: float) -> None:
+        """ swept move, same as Ball.move : stop on the first paddle on the way,
+        bounce with the Ball.bounce_on_paddle angle, finish the tick
+        """
+        move_x = self.ball_speed * dt * self.ball_dx
+        move_y = self.ball_speed * dt * self.ball_dy
+
+        first_impact = np.full(self.count, np.inf)
+        first_side = np.full(self.count, -1, dtype=np.int8)
+        # the positions are stored in float32 like FRect, but computed in float64
+        ball_x = self.ball_x.astype(np.float64)
+        ball_y = self.ball_y.astype(np.float64)
+        for side in (LEFT, RIGHT):
+            paddle_x = float(self.paddle_x[side])
+            paddle_y = self.paddle_y[:, side].astype(np.float64)
+            enter_x, leave_x = _slab(
+                ball_x, move_x, paddle_x - self.ball_w, paddle_x + self.paddle_w,
+            )
+            enter_y, leave_y = _slab(
+                ball_y, move_y, paddle_y - self.ball_h, paddle_y + self.paddle_h,
+            )
+            enter = np.maximum(np.maximum(enter_x, enter_y), 0.0)
+            leave = np.minimum(leave_x, leave_y)
+
+            # touching edges do not collide, like colliderect
+            hit = (enter < leave) & (leave > 0) & (enter <= 1) & (enter <= first_impact)
+            first_impact[hit] = enter[hit]
+            first_side[hit] = side
+
+        # free balls
+        free = first_side < 0
+        self.ball_x[free] += move_x[free]
+        self.ball_y[free] += move_y[free]
+        if free.all():
+            return
+
+        # go to the contact, bounce, then finish the tick
+        hit = ~free
+        impact = first_impact[hit]
+        self.ball_x[hit] += move_x[hit] * impact
+        self.ball_y[hit] += move_y[hit] * impact
+
+        paddle_centery = self.paddle_y[hit, first_side[hit]].astype(np.float64) + self.paddle_h / 2
+        distance = self.ball_y[hit].astype(np.float64) + self.ball_h / 2 - paddle_centery
+        normalized_distance = distance / (self.paddle_h / 2)
+        bounce_angle = np.radians(self.max_bounce_angle * normalized_distance)
+
+        self.ball_dy[hit] = np.sin(bounce_angle)
+        self.ball_dx[hit] = np.where(
+            self.ball_x[hit] > self.width / 2,
+            -np.cos(bounce_angle),
+            np.cos(bounce_angle),
+        )
+
+        remaining = (1 - impact) * dt * self.ball_speed
+        self.ball_x[hit] += self.ball_dx[hit] * remaining
+        self.ball_y[hit] += self.ball_dy[hit] * remaining
+
+    def _collide_with_walls(self) -> np.ndarray:
+        """ bounce on walls and ceiling, score in the goals """
+        goals = np.zeros(self.count, dtype=np.int8)
+        mask, outside_goal = self._mask, self._other
+
+        for side in (LEFT, RIGHT):
+            if side == LEFT:
+                np.less(self.ball_x, 0, out=mask)
+            else:
+                np.greater(self.ball_x + self.ball_w, self.width, out=mask)
+            if not mask.any():
+                continue
+
+            np.less(self.ball_y, self.goal_top, out=outside_goal)
+            outside_goal |= self.ball_y + self.ball_h > self.goal_bottom
+
+            # bounce on the wall around the goal
+            bounce = mask & outside_goal
+            self.ball_x[bounce] = 0.0 if side == LEFT else self.width - self.ball_w
+            self.ball_dx[bounce] = 1.0 if side == LEFT else -1.0
+
+            # goal, the other side score and the ball go back to the center
+            goal = mask & ~outside_goal
+            self.score[goal, RIGHT if side == LEFT else LEFT] += 1
+            goals[goal] = -1 if side == LEFT else 1
+            # like FRect.center = ..., a move by the offset of the center, in float32
+            for position, size, center in (
+                (self.ball_x, self.ball_w, self.width / 2),
+                (self.ball_y, self.ball_h, self.height / 2),
+            ):
+                moved = position[goal]
+                position[goal] = moved + (np.float32(center) - (moved + np.float32(size / 2)))
+            self.ball_dy[goal] = 0.0
+            self.ball_dx[goal] = -1.0 if side == LEFT else 1.0
+
+        # ceiling
+        np.less(self.ball_y, 0, out=mask)
+        self.ball_y[mask] = 0.0
+        self.ball_dy[mask] = 1.0
+        # floor
+        np.greater(self.ball_y + self.ball_h, self.height, out=mask)
+        self.ball_dy[mask] = -1.0
+        self.ball_y[mask] = self.height - self.ball_h
+
+        return goals
+
+
+def _slab(
+    position: np.ndarray,
+    move: np.ndarray,
+    low: np.ndarray | float,
+    high: np.ndarray | float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """ fractions of the moves entering and leaving the ]low, high[ slab,
+    see Ball.time_of_impact
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        first = (low - position) / move
+        second = (high - position) / move
+    enter = np.minimum(first, second)
+    leave = np.maximum(first, second)
+
+    # not moving on this axis, inside the slab forever or never
+    still = move == 0
+    if still.any():
+        inside = (low < position) & (position < high)
+        enter = np.where(still, np.where(inside, -np.inf, np.inf), enter)
+        leave = np.where(still, np.where(inside, np.inf, -np.inf), leave)
+    return enter, leave
@@ -0,0 +1,8 @@
+""" benchmarks of the physics, the rendering and the state transitions.
+Everything run headless (SDL_VIDEODRIVER=dummy), every result is a rate,
+higher is better, so a run can be compared to a baseline run.
+
+python -m benchmarks [--output results.json]
+python -m benchmarks --save-baseline : store the run as benchmarks/baseline.json
+python -m benchmarks --compare : fail if a rate dropped past the tolerance
+"""
@@ -0,0 +1,86 @@
+""" run the benchmarks, compare them to a baseline """
+import argparse
+import json
+import platform
+import sys
+from typing import Any
+import pygame
+# sets the dummy drivers, before the display is created
+from benchmarks.game import make_game
+from benchmarks import physics, rendering, transitions
+
+BASELINE = 'benchmarks/baseline.json'
+TOLERANCE = 0.3  # a rate can drop that much before it's a regression
+
+
+def run_all() -> dict[str, Any]:
+    """ every benchmark, with what they ran on """
+    game = make_game()
+    results: dict[str, float] = {}
+    for name, section in (
+        ('physics', physics.run),
+        ('rendering', lambda: rendering.run(game)),
+        ('transitions', lambda: transitions.run(game)),
+    ):
+        print(f'{name}...', file=sys.stderr, flush=True)
+        results.update(section())
+    return {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def regressions(
+    results: dict[str, float],
+    baseline: dict[str, float],
+    tolerance: float,
+) -> list[str]:
+    """ a line for every rate lower than the baseline past the tolerance """
+    lines = []
+    for name, old in baseline.items():
+        new = results.get(name)
+        if new is not None and new < old * (1 - tolerance):
+            lines.append(f'{name}: {new:.0f}/s, was {old:.0f}/s ({new / old - 1:+.0%})')
+    return lines
+
+
+def main() -> None:
+    """ run, print, save and compare """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--output', help='write the results to this json file')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument(
+        '--save-baseline', action='store_true', help='store this run as the baseline',
+    )
+    parser.add_argument('--compare', action='store_true', help='exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    arguments = parser.parse_args()
+
+    run = run_all()
+    for name, value in run['results'].items():
+        print(f'{name:<40}{value:>14.0f}')
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as file:
+            json.dump(run, file, indent=1)
+    if arguments.save_baseline:
+        with open(arguments.baseline, 'w', encoding='utf-8') as file:
+            json.dump(run, file, indent=1)
+        print(f'baseline saved to {arguments.baseline}')
+
+    if arguments.compare:
+        with open(arguments.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        found = regressions(run['results'], baseline['results'], arguments.tolerance)
+        if found:
+            print('regressions :')
+            for line in found:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'no regression against {arguments.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+""" a game on the dummy video driver, for the benchmarks needing a display """
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+# pylint: disable=wrong-import-position
+import settings
+import states
+from main import Game
+# pylint: enable=wrong-import-position
+
+
+def make_game() -> Game:
+    """ a game in the main menu, every asset loaded """
+    settings.SOUND = False
+    settings.RECORD_REPLAYS = False
+    # the game parse nothing, but never read the benchmark arguments
+    argv, sys.argv = sys.argv, sys.argv[:1]
+    try:
+        game = Game()
+    finally:
+        sys.argv = argv
+    while not isinstance(game.stack[-1], states.Mainmenu):
+        game.update()
+    return game
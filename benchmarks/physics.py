@@ -0,0 +1,81 @@
+""" ticks per second of the entities and of the match, headless """
+import math
+from config import MatchConfig
+from simulation import Match, follow_ball
+from ai import PaddleAI
+from inputs import Action
+from benchmarks.timing import rate
+
+# balls on the field for the scaling curve
+BALL_COUNTS = (25, 50, 100, 200, 400)
+
+
+def playing_match(ticks: int = 120, config: MatchConfig | None = None) -> Match:
+    """ a seeded match, played a bit so the ball moves diagonally """
+    match = Match(seed=0, config=config)
+    controllers = [follow_ball(0), follow_ball(1)]
+    for _ in range(ticks):
+        match.step([controller(match) for controller in controllers])
+    return match
+
+
+def spread_balls(match: Match) -> None:
+    """ scatter the balls over the field, going every way like in a long chaos
+    match. Spawned balls all start at one point, in one cell of the broadphase
+    grid, its worst case
+    """
+    config = match.config
+    rng = match.rng
+    for ball in match.balls[1:]:
+        ball.frect.topleft = (
+            rng.uniform(0, config.width - ball.frect.width),
+            rng.uniform(0, config.height - ball.frect.height),
+        )
+        ball.previous = ball.frect.topleft
+        angle = math.radians(rng.uniform(-config.max_bounce_angle, config.max_bounce_angle))
+        ball.direction.update(rng.choice([-1, 1]) * math.cos(angle), math.sin(angle))
+
+
+def run() -> dict[str, float]:
+    """ every physics rate """
+    results: dict[str, float] = {}
+    match = playing_match()
+
+    paddle = match.paddles[0]
+    actions = [Action.UP, Action.DOWN]
+
+    def paddle_update() -> None:
+        paddle.update(actions=actions[int(paddle.frect.top <= 0)])
+    results['paddle_update_per_s'] = rate(paddle_update)
+
+    # the ball keeps bouncing and scoring, the paddles stay still
+    results['ball_update_per_s'] = rate(lambda: match.ball.update(match.paddles))
+
+    results['match_step_per_s'] = rate(lambda: match.step([0, 0]))
+
+    # a cached tick, then a solve every call as the direction keep changing
+    ai = PaddleAI(1, seed=0)
+    results['ai_tick_per_s'] = rate(lambda: ai(match))
+
+    def ai_solve() -> None:
+        ai.key = None
+        ai(match)
+    results['ai_solve_per_s'] = rate(ai_solve)
+
+    # cost of the balls, the broadphase and the ball to ball collisions
+    for count in BALL_COUNTS:
+        config = match.config.with_settings({'MAX_BALLS': count, 'BALL_MULTIPLYER': count})
+        crowded = playing_match(config=config)
+        crowded.spawn_balls((crowded.ball.frect.centerx, crowded.ball.frect.centery))
+        spread_balls(crowded)
+        # scoring balls vanish, refill from the same state every call
+        state = crowded.get_state()
+
+        # called right away by rate(), the loop variables can't change under it
+        # pylint: disable=cell-var-from-loop
+        def crowded_step() -> None:
+            crowded.set_state(state)
+            crowded.step([0, 0])
+        # pylint: enable=cell-var-from-loop
+        results[f'match_step_{count}_balls_per_s'] = rate(crowded_step)
+    return results
@@ -0,0 +1,39 @@
+""" frames per second of the states render, on the dummy display """
+import settings
+import states
+from main import Game
+from benchmarks.timing import rate
+
+
+def run(game: Game) -> dict[str, float]:
+    """ every render rate """
+    results: dict[str, float] = {}
+    canvas = game.display
+
+    menu = game.stack[-1]
+    results['mainmenu_render_per_s'] = rate(lambda: menu.render(canvas))
+
+    gameplay = states.Gameplay(game)
+    game.alpha = 0.5
+
+    def full_render() -> None:
+        gameplay.full_redraw = True
+        gameplay.render(canvas)
+    results['gameplay_full_render_per_s'] = rate(full_render)
+
+    # what the game does every frame, the dirty rects path
+    gameplay.render(canvas)
+    results['gameplay_render_per_s'] = rate(lambda: gameplay.render(canvas))
+
+    # a crowded field
+    gameplay.match.spawn_balls((settings.WIDTH / 2, settings.HEIGHT / 2))
+    results['gameplay_render_many_balls_per_s'] = rate(lambda: gameplay.render(canvas))
+
+    # transparent menu over the frozen match, composed once
+    pause = states.Pause(game, gameplay.match.score)
+    pause.render(canvas)
+    results['pause_render_per_s'] = rate(lambda: pause.render(canvas))
+
+    pause.exit_state()
+    gameplay.exit_state()
+    return results
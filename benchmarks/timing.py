@@ -0,0 +1,30 @@
+""" timing helpers shared by the benchmarks """
+from collections.abc import Callable
+import time
+
+# a rate is the best of REPEAT runs of at least MIN_TIME seconds each,
+# the best run is the one the least disturbed by the rest of the machine
+MIN_TIME = 0.2
+REPEAT = 5
+
+
+def rate(function: Callable[[], object], min_time: float = MIN_TIME, repeat: int = REPEAT) -> float:
+    """ calls per second of function """
+    # how many calls fill min_time, found by doubling
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return calls / best
@@ -0,0 +1,29 @@
+""" state changes per second : new match, pause, win """
+import states
+from main import Game
+from benchmarks.timing import rate
+
+
+def run(game: Game) -> dict[str, float]:
+    """ every transition rate, the stack end as it started """
+    results: dict[str, float] = {}
+
+    def new_gameplay() -> None:
+        states.Gameplay(game).exit_state()
+    results['gameplay_new_per_s'] = rate(new_gameplay)
+
+    gameplay = states.Gameplay(game)
+    gameplay.render(game.display)
+
+    def pause() -> None:
+        # the overlay is composed on the first render
+        paused = states.Pause(game, gameplay.match.score)
+        paused.render(game.display)
+        paused.exit_state()
+    results['pause_push_pop_per_s'] = rate(pause)
+
+    score = gameplay.match.score
+    results['win_push_pop_per_s'] = rate(lambda: states.Win(game, score).exit_state())
+
+    gameplay.exit_state()
+    return results
@@ -0,0 +1,63 @@
+""" broadphase for the collisions.
+Only the things sharing a cell of a uniform grid are tested against each other,
+so hundreds of balls cost O(n) instead of O(n²) colliderect calls.
+"""
+from collections.abc import Iterator
+from typing import Generic, TypeVar
+import math
+import pygame
+
+T = TypeVar('T')
+
+
+class SpatialGrid(Generic[T]):
+    """ uniform grid rebuilt every tick.
+    insert() every item with its rect, then ask for the pairs or query a rect.
+    Returned candidates may not collide, the narrowphase (colliderect) decide.
+    """
+    __slots__ = ('cell_size', 'cells')
+
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[T]] = {}
+
+    def clear(self) -> None:
+        """ forget every item, call it before inserting the new positions """
+        self.cells.clear()
+
+    def _keys(self, rect: pygame.FRect) -> Iterator[tuple[int, int]]:
+        """ keys of all the cells overlapped by the rect """
+        size = self.cell_size
+        for x in range(math.floor(rect.left / size), math.floor(rect.right / size) + 1):
+            for y in range(math.floor(rect.top / size), math.floor(rect.bottom / size) + 1):
+                yield x, y
+
+    def insert(self, item: T, rect: pygame.FRect) -> None:
+        """ add the item in every cell overlapped by the rect """
+        for key in self._keys(rect):
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [item]
+            else:
+                cell.append(item)
+
+    def query(self, rect: pygame.FRect) -> list[T]:
+        """ items sharing at least one cell with the rect, without duplicates """
+        found: dict[int, T] = {}
+        for key in self._keys(rect):
+            for item in self.cells.get(key, ()):
+                found[id(item)] = item
+        return list(found.values())
+
+    def pairs(self) -> Iterator[tuple[T, T]]:
+        """ every pair of items sharing a cell, each pair only once """
+        seen: set[tuple[int, int]] = set()
+        for cell in self.cells.values():
+            for i, first in enumerate(cell):
+                for second in cell[i + 1:]:
+                    key = (id(first), id(second))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    seen.add((key[1], key[0]))
+                    yield first, second
@@ -0,0 +1,103 @@
+""" per match configuration and score.
+A match read its physics from its MatchConfig and count its goals in its
+Score, never in the settings module, so any number of matches with their
+own difficulty can run side by side in one process.
+"""
+from collections.abc import Mapping
+from dataclasses import dataclass, fields, replace
+from typing import Any
+import settings
+
+
+@dataclass(frozen=True, slots=True)
+class MatchConfig:
+    """ every setting a match read, immutable so matches can share one.
+    The fields are the lowercase names of the settings they default to.
+    """
+    width: int
+    height: int
+    goal_top: float
+    goal_bottom: float
+    paddle_size: tuple[int, int]
+    ball_size: tuple[int, int]
+    paddle_speed: float
+    ball_speed: float
+    max_bounce_angle: float
+    max_balls: int
+    ball_multiplyer: int
+    chaos: bool
+    broadphase_cell_size: int
+    win_score: int
+    powerup_speed: float
+    powerup_big_padlle_duration: float
+    powerup_paddle_size: float
+    powerup_paddle_chance: float
+    powerup_ball_chance: float
+
+    @classmethod
+    def from_settings(cls) -> 'MatchConfig':
+        """ the current values of the settings """
+        return cls(**{field.name: getattr(settings, field.name.upper()) for field in fields(cls)})
+
+    def with_settings(self, values: Mapping[str, Any]) -> 'MatchConfig':
+        """ copy with some settings changed, by setting name (BALL_SPEED...).
+        raise TypeError on a setting a match doesn't read
+        """
+        return replace(self, **{name.lower(): value for name, value in values.items()})
+
+    def with_difficulty(self, name: str) -> 'MatchConfig':
+        """ copy with a settings.DIFFICULTIES preset """
+        return self.with_settings(settings.DIFFICULTIES[name])
+
+    def resized(self, width: int, height: int) -> 'MatchConfig':
+        """ copy for another field size, the goals keep their proportions """
+        return replace(
+            self,
+            width=width,
+            height=height,
+            goal_top=self.goal_top * height / self.height,
+            goal_bottom=self.goal_bottom * height / self.height,
+        )
+
+    def as_settings(self) -> dict[str, Any]:
+        """ the values by setting name, from_settings() give back this config """
+        return {field.name.upper(): getattr(self, field.name) for field in fields(self)}
+
+
+@dataclass(slots=True)
+class Score:
+    """ goals of each side in a match """
+    left: int = 0
+    right: int = 0
+
+    def goal(self, side: str) -> None:
+        """ one more goal for 'LEFT' or 'RIGHT' """
+        if side == 'LEFT':
+            self.left += 1
+        else:
+            self.right += 1
+
+    def reset(self) -> None:
+        """ back to 0-0 """
+        self.left = self.right = 0
+
+    def winner(self, win_score: int) -> str | None:
+        """ 'LEFT' or 'RIGHT' once a side reached win_score """
+        if self.right >= win_score:
+            return 'RIGHT'
+        if self.left >= win_score:
+            return 'LEFT'
+        return None
+
+    def as_dict(self) -> dict[str, int]:
+        """ {'RIGHT': right, 'LEFT': left}, in the order of the old global score
+        so the replay digests don't change
+        """
+        return {'RIGHT': self.right, 'LEFT': self.left}
+
+    def update(self, score: Mapping[str, int]) -> None:
+        """ set both sides from as_dict() """
+        self.left, self.right = score['LEFT'], score['RIGHT']
+
+    def __str__(self) -> str:
+        return f'{self.left}-{self.right}'
@@ -1,46 +1,78 @@
-""" Define elements of the game, like a ball """
+""" Define elements of the game, like a ball.
+The entities are slotted and their images come from the assets cache, a
+headless match is only its positions, directions and a few references.
+"""
 import random
 import math
+from collections.abc import Callable, Iterable
 import pygame
 import settings
-import sound
+import assets
+from config import MatchConfig, Score
+from inputs import Action
+from prng import MatchRandom
+
+
+def no_sound() -> None:
+    """ default hit callback, used by headless entities """
+
+
+def interpolate(frect: pygame.FRect, previous: tuple[float, float], alpha: float) -> pygame.FRect:
+    """ copy of frect moved between its previous top left (alpha 0) and now (alpha 1) """
+    if alpha >= 1:
+        return frect
+    return pygame.FRect(
+        previous[0] + (frect.x - previous[0]) * alpha,
+        previous[1] + (frect.y - previous[1]) * alpha,
+        frect.width,
+        frect.height,
+    )
 
 class Paddle:
-    """ move with keys, collide with walls and powerups """
-    def __init__(self, pos: tuple[float, float], keybinds) -> None:
+    """ move with its player actions, collide with walls and powerups """
+    __slots__ = ('config', 'speed', 'direction', 'player', 'frect', 'previous')
+
+    def __init__(
+        self,
+        pos: tuple[float, float],
+        player: int,
+        config: MatchConfig,
+    ) -> None:
         super().__init__()
 
-        self.speed = settings.PADDLE_SPEED
+        self.config = config
+        self.speed = config.paddle_speed
         self.direction = pygame.Vector2(0, 0)
 
-        self.image: pygame.Surface = pygame.image.load(
-            file='assets/Paddles/Neo/Neo_Paddle_128x28.png'
-            ).convert()
-        self.image.set_colorkey('#ff00ff')
-        #self.image.set_colorkey('#ff00d3')
-        self.image = pygame.transform.rotate(
-            surface=self.image,
-            angle=90,
-        )
+        self.player = player
 
-        self.keybinds = keybinds
-
-        self.frect: pygame.FRect = self.image.get_frect()
+        self.frect: pygame.FRect = pygame.FRect((0, 0), config.paddle_size)
         self.frect.center = pos
+        # top left at the previous tick, to interpolate the rendering
+        self.previous: tuple[float, float] = self.frect.topleft
+
+    @property
+    def image(self) -> pygame.Surface:
+        """ shared by every paddle, only loaded to render """
+        return assets.image(settings.PADDLE_IMAGE, colorkey=settings.COLORKEY, angle=90)
+
+    def update(self, actions: int, dt: float = 1.0) -> None:
+        """ change the direction, move and collide.
+        actions is the bitmask of the actions held by the player
+        """
+        self.previous = self.frect.topleft
 
-    def update(self, keys: set[str]) -> None:
-        """ change the direction, move and collide """
         # update direction with arrows
-        if self.keybinds.UP in keys:
+        if actions & Action.UP:
             self.direction.y = -1
-        elif self.keybinds.DOWN in keys:
+        elif actions & Action.DOWN:
             self.direction.y = 1
         else:
             self.direction.y = 0
 
         # move the paddle
-        self.frect.x += self.speed * self.direction.x
-        self.frect.y += self.speed * self.direction.y
+        self.frect.x += self.speed * self.direction.x * dt
+        self.frect.y += self.speed * self.direction.y * dt
 
         # collide powerups
         # for powerup in powerups:
@@ -49,71 +81,150 @@ class Paddle:
 
         # collide with walls
         # y-axis
-        if self.frect.bottom > settings.HEIGHT:
-            self.frect.bottom = settings.HEIGHT
+        if self.frect.bottom > self.config.height:
+            self.frect.bottom = self.config.height
             #keys.remove('DOWN')
         elif self.frect.top < 0:
             self.frect.top = 0
 
-    def render(self, canvas: pygame.Surface) -> None:
-        """ blit it's image to a surface """
-        canvas.blit(self.image, self.frect)
+    def render(self, canvas: pygame.Surface, alpha: float = 1.0) -> pygame.Rect:
+        """ blit it's image to a surface.
+        alpha interpolate between the previous tick (0) and the last one (1)
+        return the area drawn on
+        """
+        frect = interpolate(self.frect, self.previous, alpha)
+        drawn = canvas.blit(self.image, frect)
         if settings.SHOW_HITBOX:
-            pygame.draw.rect(
+            drawn.union_ip(pygame.draw.rect(
                 surface=canvas,
                 color=settings.HITBOX_COLOR,
-                rect=self.frect,
+                rect=frect,
                 width=1
-            )
-
-        if settings.DEBUG_POS:
-            print(f'paddle position : {self.frect.x}, {self.frect.y}')
+            ))
 
         if settings.SHOW_DIRECTIONS:
-            pygame.draw.line(
+            drawn.union_ip(pygame.draw.line(
                 surface=canvas,
                 color=settings.DIRECTION_COLOR,
-                start_pos=self.frect.center,
+                start_pos=frect.center,
                 end_pos=(
-                    self.frect.centerx + self.direction.x * self.speed * 20,
-                    self.frect.centery + self.direction.y * self.speed * 20
+                    frect.centerx + self.direction.x * self.speed * 20,
+                    frect.centery + self.direction.y * self.speed * 20
                 ),
                 width=2,
-            )
+            ))
+
+        return drawn
 
 
 class Ball:
     """ ball class, collide with other entities """
-    def __init__(self, pos: tuple[float, float]) -> None:
-        super().__init__()
+    __slots__ = ('config', 'speed', 'direction', 'frect', 'previous', 'score', 'on_hit')
 
-        self.speed: int = settings.BALL_SPEED
-        self.direction: pygame.Vector2 = pygame.Vector2(
-            x=random.choice([-1, 1]),
-            y=0)
+    def __init__(
+        self,
+        pos: tuple[float, float],
+        config: MatchConfig,
+        score: Score | None = None,
+        on_hit: Callable[[], object] = no_sound,
+        direction: tuple[float, float] | None = None,
+        rng: MatchRandom | None = None,
+    ) -> None:
+        super().__init__()
 
-        self.image: pygame.Surface = pygame.image.load(
-            file='assets/Balls/Glass/Ball_Blue_Glass-32x32.png'
-        ).convert()
-        self.image.set_colorkey('#ff00ff')
+        self.config = config
+        self.speed: float = config.ball_speed
+        if direction is None:
+            # the side is drawn from the match rng, to replay the same match
+            side = random.choice([-1, 1]) if rng is None else rng.choice([-1, 1])
+            direction = (side, 0)
+        self.direction: pygame.Vector2 = pygame.Vector2(direction)
 
-        self.frect: pygame.FRect = self.image.get_frect()
+        self.frect: pygame.FRect = pygame.FRect((0, 0), config.ball_size)
         self.frect.center = pos
+        # top left at the previous tick, to interpolate the rendering
+        self.previous: tuple[float, float] = self.frect.topleft
 
-        """Sounds"""
+        # the score to increment on goals, the match one, its own by default
+        self.score = Score() if score is None else score
 
-        self.ball_hit = sound.ball_hit
+        # called on every bounce, play a sound in game and nothing headless
+        self.on_hit = on_hit
+
+    @property
+    def image(self) -> pygame.Surface:
+        """ shared by every ball, only loaded to render """
+        return assets.image(settings.BALL_IMAGE, colorkey=settings.COLORKEY)
 
     def update(
         self,
         paddles: list[Paddle],
+        dt: float = 1.0,
     ) -> None:
         """change the position of the ball"""
-
-        self.frect.x += self.speed * self.direction.x
-        self.frect.y += self.speed * self.direction.y
-
-        self.collide(paddles)
+        self.move(paddles, dt)
+        self.collide_with_walls()
+        self.clamp_direction()
+
+    def move(self, paddles: Iterable[Paddle] = (), dt: float = 1.0) -> bool:
+        """ move along the direction for dt ticks.
+        The move is swept : the ball stop on the first paddle on its way, bounce,
+        and use the rest of the tick in the new direction, so it never tunnel
+        through a paddle whatever the speed or the tick length.
+        return True if a paddle sent the ball back, a ball stuck in a paddle
+        hit it every tick without turning back
+        """
+        self.previous = self.frect.topleft
+
+        move_x = self.speed * self.direction.x * dt
+        move_y = self.speed * self.direction.y * dt
+
+        first_paddle = None
+        first_impact = 1.0
+        for paddle in paddles:
+            impact = self.time_of_impact(paddle.frect, move_x, move_y)
+            if impact is not None and impact <= first_impact:
+                first_paddle, first_impact = paddle, impact
+
+        if first_paddle is None:
+            self.frect.x += move_x
+            self.frect.y += move_y
+            return False
+
+        # go to the contact, bounce, then finish the tick
+        self.frect.x += move_x * first_impact
+        self.frect.y += move_y * first_impact
+        going_right = self.direction.x > 0
+        self.bounce_on_paddle(first_paddle)
+        remaining = (1 - first_impact) * dt
+        self.frect.x += self.speed * self.direction.x * remaining
+        self.frect.y += self.speed * self.direction.y * remaining
+        return (self.direction.x > 0) != going_right
+
+    def time_of_impact(self, rect: pygame.FRect, move_x: float, move_y: float) -> float | None:
+        """ fraction of the move (move_x, move_y) after which the ball touch the rect.
+        0 if they already overlap, None if the ball miss it during this move.
+        Slab test of the ball top left corner against the rect grown by the ball size.
+        """
+        enter, leave = -math.inf, math.inf
+        for position, move, low, high in (
+            (self.frect.x, move_x, rect.left - self.frect.width, rect.right),
+            (self.frect.y, move_y, rect.top - self.frect.height, rect.bottom),
+        ):
+            if move == 0:
+                # never cross this axis, must already be inside the slab
+                if not low < position < high:
+                    return None
+                continue
+            first, second = (low - position) / move, (high - position) / move
+            if first > second:
+                first, second = second, first
+            enter, leave = max(enter, first), min(leave, second)
+
+        # touching edges do not collide, like colliderect
+        if enter >= leave or leave <= 0 or enter > 1:
+            return None
+        return max(enter, 0.0)
 
     def collide(
         self,
@@ -123,102 +234,169 @@ class Ball:
 
         self.collide_with_paddle(paddles=paddles)
         self.collide_with_walls()
+        self.clamp_direction()
 
+    def swept_frect(self, dt: float = 1.0) -> pygame.FRect:
+        """ area covered by the ball during its next move """
+        return self.frect.union(self.frect.move(
+            self.speed * self.direction.x * dt,
+            self.speed * self.direction.y * dt,
+        ))
+
+    def clamp_direction(self) -> None:
+        """ keep the direction at most 1 long """
         if self.direction.magnitude() > 1:
             self.direction.normalize_ip()
 
-
-    def collide_with_walls(self) -> None:
-        """ bounce on walls and ceiling """
+    def collide_with_walls(self) -> bool:
+        """ bounce on walls and ceiling.
+        return True if the ball went in a goal
+        """
+        config = self.config
+        scored = False
         # left
         if self.frect.left < 0:
-            if (self.frect.top < settings.GOAL_TOP or self.frect.bottom > settings.GOAL_BOTTOM):
+            if (self.frect.top < config.goal_top or self.frect.bottom > config.goal_bottom):
                 self.frect.left = 0
                 self.direction.x = 1
-                pygame.mixer.Sound.play(self.ball_hit)
+                self.on_hit()
             else:
-                settings.score['RIGHT'] += 1
-                self.frect.center = settings.WIDTH/2, settings.HEIGHT/2
+                self.score.right += 1
+                scored = True
+                self.frect.center = config.width/2, config.height/2
+                self.previous = self.frect.topleft
                 self.direction.y = 0
                 self.direction.x = -1
-                pygame.mixer.Sound.play(self.ball_hit)
+                self.on_hit()
         # right
-        if self.frect.right > settings.WIDTH:
-            if (self.frect.top < settings.GOAL_TOP or self.frect.bottom > settings.GOAL_BOTTOM):
-                self.frect.right = settings.WIDTH
+        if self.frect.right > config.width:
+            if (self.frect.top < config.goal_top or self.frect.bottom > config.goal_bottom):
+                self.frect.right = config.width
                 self.direction.x = -1
-                pygame.mixer.Sound.play(self.ball_hit)
+                self.on_hit()
             else:
-                self.frect.center = settings.WIDTH/2, settings.HEIGHT/2
-                settings.score['LEFT'] += 1
+                self.frect.center = config.width/2, config.height/2
+                self.previous = self.frect.topleft
+                self.score.left += 1
+                scored = True
                 self.direction.y = 0
                 self.direction.x = 1
-                pygame.mixer.Sound.play(self.ball_hit)
+                self.on_hit()
 
         # ceiling
         if self.frect.top < 0:
             self.frect.top = 0
             self.direction.y = 1
-            pygame.mixer.Sound.play(self.ball_hit)
+            self.on_hit()
         # floor
-        if self.frect.bottom > settings.HEIGHT:
+        if self.frect.bottom > config.height:
             self.direction.y = -1
-            self.frect.bottom = settings.HEIGHT
-            pygame.mixer.Sound.play(self.ball_hit)
+            self.frect.bottom = config.height
+            self.on_hit()
 
-    def collide_with_paddle(self, paddles: list[Paddle]) -> None:
-        """ bounce on paddle, calculate bounce angle """
+        return scored
+
+    def collide_with_paddle(self, paddles: list[Paddle]) -> bool:
+        """ bounce on overlapping paddles.
+        return True if a paddle was hit
+        """
+        hit = False
         for paddle in paddles:
             if self.frect.colliderect(paddle.frect):
-                # calculate angle
-                distance = self.frect.centery - paddle.frect.centery
-                normalized_distance = distance/(paddle.frect.height/2)
-                bounce_angle = settings.MAX_BOUNCE_ANGLE * normalized_distance
-                bounce_angle_in_radian = math.radians(bounce_angle)
-
-                self.direction.y = math.sin(bounce_angle_in_radian)
-                # clamp left or right direction depending on the paddle position
-                # if the paddle is on the right the ball bounce to the left
-                if self.frect.x > settings.WIDTH/2:
-                    self.direction.x = -math.cos(bounce_angle_in_radian)
-                else:
-                    self.direction.x = math.cos(bounce_angle_in_radian)
-                pygame.mixer.Sound.play(self.ball_hit)
-
-    def render(self, canvas: pygame.Surface) -> None:
-        """ blit it's image to a surface """
-
-        # rotate the image
+                self.bounce_on_paddle(paddle)
+                hit = True
+        return hit
+
+    def bounce_on_paddle(self, paddle: Paddle) -> None:
+        """ calculate bounce angle """
+        distance = self.frect.centery - paddle.frect.centery
+        normalized_distance = distance/(paddle.frect.height/2)
+        bounce_angle = self.config.max_bounce_angle * normalized_distance
+        bounce_angle_in_radian = math.radians(bounce_angle)
+
+        self.direction.y = math.sin(bounce_angle_in_radian)
+        # clamp left or right direction depending on the paddle position
+        # if the paddle is on the right the ball bounce to the left
+        if self.frect.x > self.config.width/2:
+            self.direction.x = -math.cos(bounce_angle_in_radian)
+        else:
+            self.direction.x = math.cos(bounce_angle_in_radian)
+        self.on_hit()
+
+    def collide_with_ball(self, other: 'Ball') -> None:
+        """ bounce between two balls of the same mass,
+        they exchange the part of their direction along the line between the centers.
+        """
+        if not self.frect.colliderect(other.frect):
+            return
+
+        normal = pygame.Vector2(other.frect.center) - pygame.Vector2(self.frect.center)
+        distance = normal.length()
+        if distance == 0:
+            return
+        normal /= distance
+
+        # already going apart, let them separate
+        exchanged = (self.direction - other.direction).dot(normal)
+        if exchanged <= 0:
+            return
+
+        self.direction -= normal * exchanged
+        other.direction += normal * exchanged
+        # balls never slow down
+        for ball in (self, other):
+            if ball.direction.length() != 0:
+                ball.direction.normalize_ip()
+
+        # push them apart so they don't stay stuck together
+        overlap = (self.frect.width - distance) / 2
+        if overlap > 0:
+            self.frect.center = pygame.Vector2(self.frect.center) - normal * overlap
+            other.frect.center = pygame.Vector2(other.frect.center) + normal * overlap
+
+        self.on_hit()
+
+    def render(self, canvas: pygame.Surface, alpha: float = 1.0) -> pygame.Rect:
+        """ blit it's image to a surface.
+        alpha interpolate between the previous tick (0) and the last one (1)
+        return the area drawn on
+        """
+        frect = interpolate(self.frect, self.previous, alpha)
+
+        # rotate the image, the rotations are cached and shared by all balls
         angle_radian = math.atan2(self.direction.x, self.direction.y)
-        rotated_image = pygame.transform.rotate(self.image, math.degrees(angle_radian))
-        rotated_image_frect = rotated_image.get_frect()
-        rotated_image_frect.center = self.frect.center
-
-        canvas.blit(rotated_image, rotated_image_frect)
+        rotated_image = assets.ball_rotations.get(
+            settings.BALL_IMAGE, self.image, math.degrees(angle_radian)
+        )
+        drawn = canvas.blit(rotated_image, (
+            frect.centerx - rotated_image.get_width() / 2,
+            frect.centery - rotated_image.get_height() / 2,
+        ))
 
         if settings.SHOW_HITBOX:
-            pygame.draw.rect(
+            rotated_image_frect = rotated_image.get_frect(center=frect.center)
+            drawn.union_ip(pygame.draw.rect(
                 surface=canvas,
                 color='#ffff00',
                 rect=rotated_image_frect,
                 width=1,
-            )
-            pygame.draw.rect(
+            ))
+            drawn.union_ip(pygame.draw.rect(
                 surface=canvas,
                 color=settings.HITBOX_COLOR,
-                rect=self.frect,
+                rect=frect,
                 width=1
-            )
+            ))
         if settings.SHOW_DIRECTIONS:
-            pygame.draw.line(
+            drawn.union_ip(pygame.draw.line(
                 surface=canvas,
                 color=settings.DIRECTION_COLOR,
-                start_pos=self.frect.center,
+                start_pos=frect.center,
                 end_pos=(
-                    self.frect.centerx + self.direction.x * self.speed * 10,
-                    self.frect.centery + self.direction.y * self.speed * 10
+                    frect.centerx + self.direction.x * self.speed * 10,
+                    frect.centery + self.direction.y * self.speed * 10
                 ),
                 width=2,
-            )
-        if settings.DEBUG_POS:
-            print(f'ball position : {self.frect.x}, {self.frect.y}')
+            ))
+
+        return drawn
@@ -0,0 +1,272 @@
+""" reinforcement learning environments.
+FoosballEnv is a gym style reset() / step() over a headless Match, the
+agent play a paddle against a PaddleAI. VectorEnv step many of them in
+lockstep with one batched call, in this process or spread on subprocesses.
+Nothing is rendered, no window is opened.
+
+python env.py [--envs 64] [--workers 4] [--steps 100000]  : random agents, steps per second
+"""
+from multiprocessing.connection import Connection
+from typing import Any
+import argparse
+import multiprocessing
+import random
+import time
+import numpy as np
+import settings
+from ai import PaddleAI
+from config import MatchConfig
+from inputs import Action
+from simulation import Match
+
+# the actions of an agent : nothing, up, down, like the keys Paddle.update read
+ACTIONS = (0, Action.UP, Action.DOWN)
+# ball center x and y, ball direction x and y, paddle center y
+OBSERVATION_SIZE = 5
+
+
+class FoosballEnv:
+    """ one match, the agent play the paddle of player.
+    The observation is seen from the left side : for the right paddle the x
+    axis is mirrored, so one policy can play both sides. Positions are
+    divided by the field size.
+    The reward is 1 for a goal scored and -1 for a goal conceded. The match is
+    terminated once someone won, truncated after max_ticks.
+    Each action is held for repeat ticks.
+    """
+
+    def __init__(
+        self,
+        player: int = 0,
+        opponent: str | None = settings.ENV_OPPONENT,
+        config: MatchConfig | None = None,
+        max_ticks: int = settings.ENV_MAX_TICKS,
+        repeat: int = settings.ENV_ACTION_REPEAT,
+        seed: int | None = None,
+    ) -> None:
+        self.player = player
+        self.opponent_difficulty = opponent
+        self.config = MatchConfig.from_settings() if config is None else config
+        self.max_ticks = max_ticks
+        self.repeat = repeat
+        # the seed of the next match, every reset play a new one
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+
+        self.match: Match
+        self.opponent: PaddleAI | None = None
+        self.actions = [0] * settings.PLAYERS
+        self.reset()
+
+    def reset(self, seed: int | None = None) -> tuple[np.ndarray, dict[str, Any]]:
+        """ start a new match, return its first observation """
+        if seed is not None:
+            self.seed = seed
+        self.match = Match(seed=self.seed, config=self.config)
+        if self.opponent_difficulty is not None:
+            self.opponent = PaddleAI(1 - self.player, self.opponent_difficulty, seed=self.seed)
+        self.seed += 1
+        return self.observe(), {}
+
+    def step(self, action: int) -> tuple[np.ndarray, float, bool, bool, dict[str, Any]]:
+        """ play one action, return observation, reward, terminated, truncated, info """
+        match, actions, opponent = self.match, self.actions, self.opponent
+        score = match.score
+        scored = 0
+        actions[self.player] = ACTIONS[action]
+        for _ in range(self.repeat):
+            if opponent is not None:
+                actions[opponent.player] = opponent(match)
+            left, right = score.left, score.right
+            match.step(actions)
+            scored += (score.left - left) - (score.right - right)
+            if match.winner is not None:
+                break
+
+        terminated = match.winner is not None
+        truncated = not terminated and match.ticks >= self.max_ticks
+        reward = float(scored if self.player == 0 else -scored)
+        return self.observe(), reward, terminated, truncated, {}
+
+    def observe(self, out: np.ndarray | None = None) -> np.ndarray:
+        """ the observation, written in out if given """
+        if out is None:
+            out = np.empty(OBSERVATION_SIZE, dtype=np.float32)
+        config = self.config
+        ball = self.match.ball
+        x = ball.frect.centerx / config.width
+        direction_x = ball.direction.x
+        if self.player == 1:
+            x, direction_x = 1 - x, -direction_x
+        out[0] = x
+        out[1] = ball.frect.centery / config.height
+        out[2] = direction_x
+        out[3] = ball.direction.y
+        out[4] = self.match.paddles[self.player].frect.centery / config.height
+        return out
+
+
+class _Envs:
+    """ a slice of the environments of a VectorEnv, stepped in a loop.
+    A finished match is reset right away, its last observation is kept aside.
+    """
+
+    def __init__(self, first: int, count: int, seed: int, options: dict[str, Any]) -> None:
+        # far apart seeds, every env play its own matches, wherever it runs
+        self.envs = [
+            FoosballEnv(seed=seed + (index << 32), **options)
+            for index in range(first, first + count)
+        ]
+        self.observations = np.zeros((count, OBSERVATION_SIZE), dtype=np.float32)
+        self.final_observations = np.zeros_like(self.observations)
+        self.rewards = np.zeros(count, dtype=np.float32)
+        self.terminated = np.zeros(count, dtype=bool)
+        self.truncated = np.zeros(count, dtype=bool)
+
+    def reset(self) -> np.ndarray:
+        """ every env start a new match """
+        for index, env in enumerate(self.envs):
+            env.reset()
+            env.observe(self.observations[index])
+        return self.observations
+
+    def step(self, actions: np.ndarray) -> tuple[np.ndarray, ...]:
+        """ observations, rewards, terminated, truncated, final observations """
+        for index, env in enumerate(self.envs):
+            _, reward, terminated, truncated, _ = env.step(int(actions[index]))
+            self.rewards[index] = reward
+            self.terminated[index] = terminated
+            self.truncated[index] = truncated
+            if terminated or truncated:
+                env.observe(self.final_observations[index])
+                env.reset()
+            env.observe(self.observations[index])
+        return (
+            self.observations, self.rewards, self.terminated, self.truncated,
+            self.final_observations,
+        )
+
+
+def _worker(
+    connection: Connection,
+    first: int,
+    count: int,
+    seed: int,
+    options: dict[str, Any],
+) -> None:
+    """ run a _Envs for a VectorEnv, until told to close """
+    envs = _Envs(first, count, seed, options)
+    while True:
+        command, actions = connection.recv()
+        if command == 'step':
+            connection.send(envs.step(actions))
+        elif command == 'reset':
+            connection.send(envs.reset())
+        else:
+            connection.close()
+            return
+
+
+class VectorEnv:
+    """ count FoosballEnv stepped in lockstep.
+    step() take an array of count actions and return arrays : observations
+    (count, OBSERVATION_SIZE), rewards, terminated and truncated, and an info
+    holding the last observation of the matches that just ended, their env
+    already reset to a new match.
+    With workers, the envs are split between that many subprocesses, each
+    step is one message per worker. The options are given to every FoosballEnv.
+    """
+
+    def __init__(self, count: int, workers: int = 0, seed: int = 0, **options: Any) -> None:
+        self.count = count
+        self.local: _Envs | None = None
+        self.connections: list[Connection] = []
+        self.processes: list[multiprocessing.Process] = []
+        # first env of every worker, and of the end
+        self.bounds: list[int] = [0]
+        if not workers:
+            self.local = _Envs(0, count, seed, options)
+            return
+
+        workers = min(workers, count)
+        for worker in range(workers):
+            start = self.bounds[-1]
+            size = count // workers + (worker < count % workers)
+            self.bounds.append(start + size)
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_worker, args=(child, start, size, seed, options), daemon=True,
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+    def reset(self) -> tuple[np.ndarray, dict[str, Any]]:
+        """ every env start a new match, return the observations """
+        if self.local is not None:
+            return self.local.reset().copy(), {}
+        for connection in self.connections:
+            connection.send(('reset', None))
+        return np.concatenate([connection.recv() for connection in self.connections]), {}
+
+    def step(
+        self,
+        actions: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, dict[str, Any]]:
+        """ one action per env, see the class """
+        if self.local is not None:
+            results = [array.copy() for array in self.local.step(actions)]
+        else:
+            for index, connection in enumerate(self.connections):
+                connection.send(('step', actions[self.bounds[index]:self.bounds[index + 1]]))
+            parts = [connection.recv() for connection in self.connections]
+            results = [np.concatenate(arrays) for arrays in zip(*parts)]
+        observations, rewards, terminated, truncated, final_observations = results
+        ended = terminated | truncated
+        return observations, rewards, terminated, truncated, {
+            'final_observation': final_observations,
+            '_final_observation': ended,
+        }
+
+    def close(self) -> None:
+        """ stop the workers """
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections.clear()
+        self.processes.clear()
+
+
+def main() -> None:
+    """ step random agents and print the throughput """
+    parser = argparse.ArgumentParser(description='random agents in the RL environments')
+    parser.add_argument('--envs', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=0, help='subprocesses, 0 for none')
+    parser.add_argument('--steps', type=int, default=100000, help='in total, every env summed')
+    parser.add_argument('--opponent', default=settings.ENV_OPPONENT,
+                        choices=settings.AI_DIFFICULTIES)
+    arguments = parser.parse_args()
+
+    vector = VectorEnv(arguments.envs, workers=arguments.workers, opponent=arguments.opponent)
+    rng = np.random.default_rng(0)
+    vector.reset()
+    start = time.perf_counter()
+    total_reward = episodes = 0.0
+    for _ in range(arguments.steps // arguments.envs):
+        actions = rng.integers(len(ACTIONS), size=arguments.envs)
+        _, rewards, terminated, truncated, _ = vector.step(actions)
+        total_reward += float(rewards.sum())
+        episodes += int((terminated | truncated).sum())
+    elapsed = time.perf_counter() - start
+    vector.close()
+
+    steps = arguments.steps // arguments.envs * arguments.envs
+    print(f'{steps} steps in {elapsed:.1f} s, {steps / elapsed:.0f} steps/s, '
+          f'{steps / elapsed * 3600 / 1e6:.1f} M steps/hour')
+    print(f'{episodes:.0f} matches ended, reward {total_reward:+.0f}')
+
+
+if __name__ == '__main__':
+    main()
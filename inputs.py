@@ -0,0 +1,161 @@
+""" inputs of every player.
+Devices are mapped to actions by the binding tables below, so adding a key,
+a controller button or a third player is a new table entry, not a new branch.
+Each player get two integer bitmasks per tick : the held actions and the
+actions pressed since the last tick.
+"""
+import pygame
+import settings
+
+
+# pylint: disable=too-few-public-methods
+class Action:
+    """ action ids, one bit each.
+    The gameplay ones are the low bits so a tick of inputs fit in a byte.
+    """
+    UP = 1 << 0
+    DOWN = 1 << 1
+    LEFT = 1 << 2
+    RIGHT = 1 << 3
+    CONFIRM = 1 << 4
+    BACK = 1 << 5
+    CHEAT_WIN = 1 << 6
+    SPAWN_BALLS = 1 << 7
+    PROFILER = 1 << 8
+    EXPORT_PROFILE = 1 << 9
+# pylint: enable=too-few-public-methods
+
+# the held actions a match react to, see simulation.Match.step
+MOVES = Action.UP | Action.DOWN | Action.LEFT | Action.RIGHT
+
+
+# key -> (player, action)
+KEYBOARD: dict[int, tuple[int, int]] = {
+    pygame.K_w: (0, Action.UP),
+    pygame.K_s: (0, Action.DOWN),
+    pygame.K_a: (0, Action.LEFT),
+    pygame.K_d: (0, Action.RIGHT),
+    pygame.K_UP: (1, Action.UP),
+    pygame.K_DOWN: (1, Action.DOWN),
+    pygame.K_LEFT: (1, Action.LEFT),
+    pygame.K_RIGHT: (1, Action.RIGHT),
+    pygame.K_RETURN: (0, Action.CONFIRM),
+    pygame.K_ESCAPE: (0, Action.BACK),
+    pygame.K_p: (0, Action.CHEAT_WIN),
+    pygame.K_b: (0, Action.SPAWN_BALLS),
+    pygame.K_F3: (0, Action.PROFILER),
+    pygame.K_F4: (0, Action.EXPORT_PROFILE),
+}
+
+# controllers, the player is the order they were plugged in
+JOYSTICK_BUTTONS: dict[int, int] = {
+    0: Action.CONFIRM,  # A / cross
+    1: Action.BACK,     # B / circle
+    7: Action.BACK,     # start
+}
+# axis -> (action when negative, action when positive)
+JOYSTICK_AXES: dict[int, tuple[int, int]] = {
+    0: (Action.LEFT, Action.RIGHT),
+    1: (Action.UP, Action.DOWN),
+}
+JOYSTICK_DEADZONE = 0.5
+
+
+def hat_actions(value: tuple[int, int]) -> int:
+    """ actions of a d-pad position """
+    x, y = value
+    actions = 0
+    if x < 0:
+        actions |= Action.LEFT
+    elif x > 0:
+        actions |= Action.RIGHT
+    if y > 0:
+        actions |= Action.UP
+    elif y < 0:
+        actions |= Action.DOWN
+    return actions
+
+
+class Inputs:
+    """ held and pressed actions of every player, as bitmasks.
+    handle() every event, poll() once per frame, then the states read
+    held[player] and take() the pressed actions they react to.
+    """
+
+    def __init__(self, players: int = settings.PLAYERS) -> None:
+        self.players = players
+        self.held: list[int] = [0] * players
+        self.pressed: list[int] = [0] * players
+
+        # controllers by instance id : (player, joystick)
+        self.joysticks: dict[int, tuple[int, pygame.joystick.JoystickType]] = {}
+        # actions held on a controller input, by (instance id, input)
+        self.joystick_held: dict[tuple[int, str], int] = {}
+
+    def handle(self, event: pygame.event.Event) -> None:
+        """ dispatch one event through the binding tables """
+        match event.type:
+            case pygame.KEYDOWN:
+                binding = KEYBOARD.get(event.key)
+                if binding is not None:
+                    player, action = binding
+                    self.pressed[player] |= action
+            case pygame.JOYDEVICEADDED:
+                joystick = pygame.joystick.Joystick(event.device_index)
+                player = len(self.joysticks) % self.players
+                self.joysticks[joystick.get_instance_id()] = (player, joystick)
+            case pygame.JOYDEVICEREMOVED:
+                self.joysticks.pop(event.instance_id, None)
+                for key in [key for key in self.joystick_held if key[0] == event.instance_id]:
+                    del self.joystick_held[key]
+            case pygame.JOYBUTTONDOWN | pygame.JOYBUTTONUP:
+                action = JOYSTICK_BUTTONS.get(event.button, 0)
+                down = event.type == pygame.JOYBUTTONDOWN
+                self._joystick(event.instance_id, f'button{event.button}', action if down else 0)
+            case pygame.JOYHATMOTION:
+                self._joystick(event.instance_id, f'hat{event.hat}', hat_actions(event.value))
+            case pygame.JOYAXISMOTION:
+                actions = JOYSTICK_AXES.get(event.axis)
+                if actions is not None:
+                    if event.value < -JOYSTICK_DEADZONE:
+                        action = actions[0]
+                    elif event.value > JOYSTICK_DEADZONE:
+                        action = actions[1]
+                    else:
+                        action = 0
+                    self._joystick(event.instance_id, f'axis{event.axis}', action)
+
+    def _joystick(self, instance_id: int, source: str, actions: int) -> None:
+        """ store what a controller input hold, newly held actions are pressed """
+        if instance_id not in self.joysticks:
+            return
+        player = self.joysticks[instance_id][0]
+        previous = self.joystick_held.get((instance_id, source), 0)
+        self.pressed[player] |= actions & ~previous
+        self.joystick_held[(instance_id, source)] = actions
+
+    def poll(self) -> None:
+        """ read the held actions from the keyboard state and the controllers """
+        held = [0] * self.players
+        keys = pygame.key.get_pressed()
+        for key, (player, action) in KEYBOARD.items():
+            if keys[key]:
+                held[player] |= action
+        for (instance_id, _), actions in self.joystick_held.items():
+            held[self.joysticks[instance_id][0]] |= actions
+        self.held = held
+
+    def take(self, action: int, player: int | None = None) -> bool:
+        """ True if the action was pressed, by the player or by anyone.
+        The press is consumed, so it trigger only once.
+        """
+        players = range(self.players) if player is None else (player,)
+        for index in players:
+            if self.pressed[index] & action:
+                self.pressed[index] &= ~action
+                return True
+        return False
+
+    def end_tick(self) -> None:
+        """ forget the presses no state took """
+        self.pressed = [0] * self.players
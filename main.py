@@ -2,10 +2,16 @@
 Copyright us
 Licence GPL-3+
 """
+import argparse
 import sys
+import time
 import pygame
 import states
 import settings
+import inputs
+import netcode
+import profiler
+from config import MatchConfig
 
 
 class Game:
@@ -13,7 +19,7 @@ class Game:
     get events (keypress)
     hold the stack
     """
-    def __init__(self) -> None:
+    def __init__(self, session: netcode.RollbackSession | None = None) -> None:
         pygame.init()
         pygame.font.init()
         pygame.display.init()
@@ -23,109 +29,182 @@ class Game:
         pygame.display.set_caption("Foosball")
         self.fullscreen = False
 
-        # init the stack
+        # online match, played as soon as the assets are loaded
+        self.session = session
+
+        # physics of the next matches, changed by the difficulty and resolution menus
+        self.config = MatchConfig.from_settings()
+        self.difficulty = 'normal'
+        # players driven by ai.PaddleAI
+        self.ai_players: tuple[int, ...] = settings.AI_PLAYERS
+
+        # init the stack, the assets load in the background
+        # then the loading state is replaced by the main menu
         self.stack: list[states.State] = []
-        states.Mainmenu(self)
+        states.Loading(self)
 
         # init global game var
         self.running: bool = True
         self.clock = pygame.time.Clock()
-        self.keys: set[str] = set()
+        self.inputs = inputs.Inputs()
+
+        # phase timings, shown with F3, the overlay is created on first use
+        self.profiler = profiler.Profiler(enabled=settings.PROFILER)
+        self.overlay: profiler.Overlay | None = None
+
+        # fraction of a tick elapsed since the last update, to interpolate the rendering
+        self.alpha: float = 1.0
+        # last state rendered, to know when to redraw the whole screen
+        self.rendered_state: states.State | None = None
 
     def main_loop(self) -> None:
         """ main game loop.
         executed once each frame.
-        handle events, updates and rendering.
+        handle events, run as many fixed updates as the elapsed time need
+        then render once, interpolated between the last two updates.
+        Static states (menus) are only updated and redrawn after an input,
+        the loop sleep on the event queue in between.
         """
+        tick = 1 / settings.SIM_HZ
+        lag = 0.0
+        previous = time.perf_counter()
         while self.running:
-            self.event()
-            self.update()
-            self.render()
-
-            # debug stack
-            if settings.DEBUG_STACK:
-                for state in self.stack:
-                    print(f'{type(state).__name__} > ', end='')
-                print()
-            # debug score
-            if settings.DEBUG_SCORE:
-                print(f'score : {settings.score}')
-
-    def event(self) -> None:
-        """get event like keyboard press or mouse input and gather them in a dict"""
-        for event in pygame.event.get():
-            match event.type:
-                case pygame.QUIT:
-                    self.running = False
-                    pygame.quit()
-                    sys.exit()
-                case pygame.KEYDOWN:
-                    match event.key:
-                        case pygame.K_ESCAPE:
-                            self.keys.add('ESCAPE')
-                        case pygame.K_RETURN:
-                            self.keys.add('RETURN')
-                        case pygame.K_UP:
-                            self.keys.add('UP')
-                            # print('up')
-                        case pygame.K_DOWN:
-                            self.keys.add('DOWN')
-                            # print('down')
-                        case pygame.K_RIGHT:
-                            self.keys.add('RIGHT')
-                        case pygame.K_LEFT:
-                            self.keys.add('LEFT')
-                        case pygame.K_p:
-                            self.keys.add('p')
-                        case pygame.K_a:
-                            self.keys.add('a')
-                        case pygame.K_d:
-                            self.keys.add('d')
-                        case pygame.K_s:
-                            self.keys.add('s')
-                        case pygame.K_w:
-                            self.keys.add('w')
-                case pygame.KEYUP:
-                    match event.key:
-                        case pygame.K_ESCAPE:
-                            self.keys.discard('ESCAPE')
-                        case pygame.K_RETURN:
-                            self.keys.discard('RETURN')
-                        case pygame.K_UP:
-                            self.keys.discard('UP')
-                        case pygame.K_DOWN:
-                            self.keys.discard('DOWN')
-                        case pygame.K_RIGHT:
-                            self.keys.discard('RIGHT')
-                        case pygame.K_LEFT:
-                            self.keys.discard('LEFT')
-                        case pygame.K_p:
-                            self.keys.discard('p')
-                        case pygame.K_a:
-                            self.keys.discard('a')
-                        case pygame.K_d:
-                            self.keys.discard('d')
-                        case pygame.K_s:
-                            self.keys.discard('s')
-                        case pygame.K_w:
-                            self.keys.discard('w')
+            state = self.stack[-1]
+            overlay = self.overlay is not None and self.overlay.visible
+            if (
+                settings.IDLE_WAIT and state.is_static and state is self.rendered_state
+                and not overlay
+            ):
+                # nothing move on screen, sleep until something happen
+                event = pygame.event.wait(timeout=settings.IDLE_WAIT_TIMEOUT)
+                if event.type == pygame.NOEVENT:
+                    continue
+                with self.profiler.measure('event'):
+                    self.event([event, *pygame.event.get()])
+                self.update()
+                self.alpha = 1.0
+                self.render()
+
+                # don't catch up the time spent sleeping
+                previous = time.perf_counter()
+                lag = 0.0
+            else:
+                now = time.perf_counter()
+                lag += now - previous
+                previous = now
+
+                with self.profiler.measure('event'):
+                    self.event()
+
+                steps = 0
+                while lag >= tick and steps < settings.MAX_CATCHUP_STEPS:
+                    self.update()
+                    lag -= tick
+                    steps += 1
+                # too far behind, drop the time we can't catch up
+                if lag >= tick:
+                    lag %= tick
+
+                self.alpha = lag / tick
+                self.render()
+
+            self.profiler.end_frame()
+
+    def event(self, events: list[pygame.event.Event] | None = None) -> None:
+        """get event like keyboard press or controller input and gather them in self.inputs.
+        read the queue unless the events are given
+        """
+        for event in pygame.event.get() if events is None else events:
+            if event.type == pygame.QUIT:
+                self.running = False
+                pygame.quit()
+                sys.exit()
+            self.inputs.handle(event)
+        self.inputs.poll()
 
     def update(self) -> None:
         """ update the last game state in the stack """
-        self.stack[-1].update(self.keys)
+        if self.inputs.take(inputs.Action.PROFILER):
+            if self.overlay is None:
+                self.overlay = profiler.Overlay(self.profiler)
+            self.overlay.toggle()
+            # draw everything again, over or without the overlay
+            self.rendered_state = None
+        if self.inputs.take(inputs.Action.EXPORT_PROFILE):
+            for path in self.profiler.export_all():
+                print(f'profile saved to {path}')
+
+        with self.profiler.measure('update'):
+            self.stack[-1].update(self.inputs)
+        self.inputs.end_tick()
 
     def render(self) -> None:
-        """ render last state in stack, update screen and limit FPS."""
-
-        self.stack[-1].render(self.display)
-
-        pygame.display.flip()
+        """ render last state in stack, update screen and limit FPS.
+        Only the dirty rects are pushed to the screen when the state gives them.
+        """
+        state = self.stack[-1]
+        if state is not self.rendered_state:
+            # a new state on top, or back on top, must draw everything
+            state.full_redraw = True
+            self.rendered_state = state
+
+        if self.overlay is not None and self.overlay.visible:
+            # the overlay cover the state, which must redraw under it every frame
+            state.full_redraw = True
+
+        with self.profiler.measure('render'):
+            state.render(self.display)
+            if self.overlay is not None and self.overlay.visible:
+                self.overlay.render(self.display, self.debug_lines())
+
+        with self.profiler.measure('flip'):
+            if state.dirty_rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(state.dirty_rects)
         self.clock.tick(settings.FPS)
 
+    def debug_lines(self) -> list[str]:
+        """ shown on the profiler overlay : the stack, the fps, the top state lines """
+        return [
+            ' > '.join(type(state).__name__ for state in self.stack),
+            f'{self.clock.get_fps():.0f} fps',
+            *self.stack[-1].debug_lines(),
+        ]
+
 
 def main():
-    """ main entrypoint """
-    game = Game()
+    """ main entrypoint.
+    --host / --join play online, see netcode.py
+    --ai PLAYER let the computer play a paddle, 1 for a single player game
+    """
+    parser = argparse.ArgumentParser(description='Foosball')
+    online = parser.add_mutually_exclusive_group()
+    online.add_argument('--host', action='store_true', help='wait for a player to join')
+    online.add_argument('--join', metavar='ADDRESS', help='join a host, as ip[:port]')
+    parser.add_argument('--port', type=int, default=settings.NET_PORT, help='local udp port')
+    parser.add_argument('--ai', type=int, action='append', choices=range(settings.PLAYERS),
+                        metavar='PLAYER', help='played by the computer, can be repeated')
+    parser.add_argument('--record', action='store_true',
+                        help=f'save the finished matches in {settings.REPLAY_DIR}/')
+    arguments = parser.parse_args()
+    if arguments.record:
+        settings.RECORD_REPLAYS = True
+
+    session = None
+    if arguments.host or arguments.join:
+        remote = None
+        if arguments.join:
+            address, _, port = arguments.join.partition(':')
+            remote = (address, int(port or settings.NET_PORT))
+        transport = netcode.UdpTransport(arguments.port if arguments.host else 0, remote)
+        session = netcode.RollbackSession(transport, host=arguments.host)
+        print('waiting for the other player...')
+        session.connect(timeout=settings.NET_CONNECT_TIMEOUT)
+
+    game = Game(session)
+    if arguments.ai:
+        game.ai_players = tuple(arguments.ai)
     game.main_loop()
 
 
@@ -0,0 +1,446 @@
+""" rollback netcode for two players over UDP.
+Both peers run the whole match from the same seed and MatchConfig. The local actions are
+applied input_delay ticks late, the remote ones are predicted (the last
+received actions are held) until they arrive. A wrong prediction rewind the
+match to that tick with Match.get_state/set_state and play the ticks again
+with the real actions, so the local player never wait for the network and
+the remote paddle is corrected a few ticks later.
+
+Every packet repeat all the local actions the remote peer didn't
+acknowledge yet, a lost packet is covered by the next one.
+
+python netcode.py [--rtt 100] [--jitter 10] [--loss 0.05] : two sessions
+over a simulated link, check they stay identical
+"""
+from collections.abc import Callable
+from typing import Any, Protocol
+import argparse
+import heapq
+import itertools
+import json
+import random
+import socket
+import struct
+import sys
+import time
+import settings
+from config import MatchConfig, Score
+from simulation import Match, follow_ball
+from replay import digest_state
+from inputs import Action
+
+# packet kinds : the guest JOIN until the host answer HELLO with the seed and
+# the config, the guest send it back, then both only send INPUTS
+JOIN = 0
+HELLO = 1
+INPUTS = 2
+# kind, seed (0 for JOIN), then for HELLO the config settings in json
+HELLO_PACKET = struct.Struct('<BI')
+# kind, first remote tick missing (ack), sender tick, sender advantage,
+# first tick sent, count, then count action bytes
+INPUTS_PACKET = struct.Struct('<BIIbIB')
+MAX_INPUTS_PER_PACKET = 255
+# the peer ahead wait at most one tick every SYNC_INTERVAL ticks
+SYNC_INTERVAL = 10
+
+
+class Transport(Protocol):
+    """ unreliable datagrams to the other peer """
+
+    def send(self, data: bytes) -> None:
+        """ send a datagram, it may be lost """
+
+    def receive(self) -> list[bytes]:
+        """ every datagram arrived since the last call, never block """
+
+
+class UdpTransport:
+    """ non blocking UDP socket.
+    The host doesn't know the remote address, it answer the first peer talking to it.
+    """
+
+    def __init__(self, port: int, remote: tuple[str, int] | None = None) -> None:
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', port))
+        self.socket.setblocking(False)
+        self.remote = remote
+
+    def send(self, data: bytes) -> None:
+        """ send to the remote peer, once known """
+        if self.remote is not None:
+            try:
+                self.socket.sendto(data, self.remote)
+            except OSError:
+                # unreachable for now, the next packets repeat this one
+                pass
+
+    def receive(self) -> list[bytes]:
+        """ read everything the remote peer sent """
+        received: list[bytes] = []
+        while True:
+            try:
+                data, address = self.socket.recvfrom(2048)
+            except (BlockingIOError, ConnectionResetError):
+                return received
+            if self.remote is None:
+                self.remote = address
+            if address == self.remote:
+                received.append(data)
+
+    def close(self) -> None:
+        """ release the port """
+        self.socket.close()
+
+
+class LoopbackTransport:
+    """ in memory link with latency, jitter and loss, see loopback_pair() """
+
+    def __init__(
+        self,
+        clock: Callable[[], float],
+        latency: float,
+        jitter: float,
+        loss: float,
+        rng: random.Random,
+    ) -> None:
+        self.clock = clock
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = rng
+        self.peer: 'LoopbackTransport | None' = None
+        # (arrival time, order, datagram)
+        self.inbox: list[tuple[float, int, bytes]] = []
+        self.order = itertools.count()
+
+    def send(self, data: bytes) -> None:
+        """ deliver to the peer later, or never """
+        if self.peer is None or self.rng.random() < self.loss:
+            return
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        heapq.heappush(self.peer.inbox, (self.clock() + delay, next(self.order), data))
+
+    def receive(self) -> list[bytes]:
+        """ datagrams whose arrival time is past """
+        received: list[bytes] = []
+        now = self.clock()
+        while self.inbox and self.inbox[0][0] <= now:
+            received.append(heapq.heappop(self.inbox)[2])
+        return received
+
+
+def loopback_pair(
+    clock: Callable[[], float] = time.monotonic,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    loss: float = 0.0,
+    seed: int = 0,
+) -> tuple[LoopbackTransport, LoopbackTransport]:
+    """ two connected transports, latency and jitter are one way, in seconds """
+    rng = random.Random(seed)
+    first = LoopbackTransport(clock, latency, jitter, loss, rng)
+    second = LoopbackTransport(clock, latency, jitter, loss, rng)
+    first.peer, second.peer = second, first
+    return first, second
+
+
+def encode_config(config: MatchConfig) -> bytes:
+    """ the config as json, for the handshake """
+    return json.dumps(config.as_settings()).encode()
+
+
+def decode_config(data: bytes) -> MatchConfig:
+    """ the config of encode_config(), json lists back to the tuples of the settings """
+    values = {
+        name: tuple(value) if isinstance(value, list) else value
+        for name, value in json.loads(data).items()
+    }
+    return MatchConfig.from_settings().with_settings(values)
+
+
+class RollbackSession:
+    """ one peer of a two players match.
+    The host (player 0) choose the seed and the config, handshake() until
+    connected, start() with a match built from that seed and config, then
+    advance() every tick.
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        host: bool,
+        seed: int | None = None,
+        config: MatchConfig | None = None,
+        input_delay: int = settings.NET_INPUT_DELAY,
+        max_rollback: int = settings.NET_MAX_ROLLBACK,
+    ) -> None:
+        self.transport = transport
+        self.host = host
+        self.local_player = 0 if host else 1
+        self.seed = random.randrange(2 ** 32) if host and seed is None else seed
+        # the guest get the rules of the host, both must simulate the same match
+        self.config = MatchConfig.from_settings() if host and config is None else config
+        self.connected = False
+        self.input_delay = input_delay
+        self.max_rollback = max_rollback
+
+        self.match: Match | None = None
+        self.dt = 1.0
+        # next tick to play
+        self.tick = 0
+        # actions by tick, nobody move during the input delay
+        self.local_actions: dict[int, int] = dict.fromkeys(range(input_delay), 0)
+        self.remote_actions: dict[int, int] = dict.fromkeys(range(input_delay), 0)
+        # remote actions used for the ticks played, predicted or not
+        self.used_actions: dict[int, int] = {}
+        # first tick whose remote actions are missing, every tick before is final
+        self.confirmed = input_delay
+        # first tick whose local actions the remote peer is missing
+        self.acked = 0
+        # last tick the remote peer told us, and how far ahead of us it think it is
+        self.remote_tick = 0
+        self.remote_advantage = 0
+        # match states before each tick not final yet
+        self.states: dict[int, dict[str, Any]] = {}
+        self.rollback_to: int | None = None
+        # True while ticks are played again, don't play sounds twice
+        self.resimulating = False
+
+        # digest of the match every NET_CHECKSUM_INTERVAL final ticks, to compare the peers
+        self.checksums: dict[int, str] = {}
+        self.rollbacks = 0
+        self.rolled_back_ticks = 0
+        self.deepest_rollback = 0
+        self.stalls = 0
+        self.waits = 0
+
+    def handshake(self) -> bool:
+        """ agree on the seed and the config, call it until it return True """
+        if not self.connected and not self.host:
+            self.transport.send(HELLO_PACKET.pack(JOIN, 0))
+        self._receive()
+        return self.connected
+
+    def connect(self, timeout: float) -> None:
+        """ handshake() until connected, raise TimeoutError after timeout seconds """
+        deadline = time.monotonic() + timeout
+        while not self.handshake():
+            if time.monotonic() > deadline:
+                raise TimeoutError('no answer from the other player')
+            time.sleep(0.01)
+
+    def start(self, match: Match, dt: float = 1.0) -> None:
+        """ play this match, built with the agreed seed and config at its first tick """
+        self.match = match
+        self.dt = dt
+
+    def _receive(self) -> None:
+        """ read the packets, note the mispredicted ticks """
+        for data in self.transport.receive():
+            if not data:
+                continue
+            if data[0] == JOIN and self.host and len(data) == HELLO_PACKET.size:
+                self.transport.send(self._hello())
+            elif data[0] == HELLO and len(data) > HELLO_PACKET.size:
+                if not self.host:
+                    _, self.seed = HELLO_PACKET.unpack_from(data)
+                    self.config = decode_config(data[HELLO_PACKET.size:])
+                    # answer every hello, one answer may be lost
+                    self.transport.send(data)
+                self.connected = True
+            elif data[0] == INPUTS and len(data) >= INPUTS_PACKET.size:
+                _, acked, tick, advantage, first, count = INPUTS_PACKET.unpack_from(data)
+                self.connected = self.seed is not None and self.config is not None
+                self.acked = max(self.acked, acked)
+                if tick >= self.remote_tick:
+                    self.remote_tick, self.remote_advantage = tick, advantage
+                self._on_remote_actions(first, data[INPUTS_PACKET.size:INPUTS_PACKET.size + count])
+
+    def _hello(self) -> bytes:
+        """ the HELLO of the host, the seed and the config """
+        assert self.seed is not None and self.config is not None
+        return HELLO_PACKET.pack(HELLO, self.seed) + encode_config(self.config)
+
+    def _on_remote_actions(self, first: int, actions: bytes) -> None:
+        """ store the new remote actions """
+        for tick, action in enumerate(actions, start=first):
+            if tick < self.confirmed or tick in self.remote_actions:
+                continue
+            self.remote_actions[tick] = action
+            used = self.used_actions.get(tick)
+            if used is not None and used != action:
+                self.rollback_to = tick if self.rollback_to is None else min(self.rollback_to, tick)
+        while self.confirmed in self.remote_actions:
+            self.confirmed += 1
+
+    def advance(self, actions: int) -> bool:
+        """ play one tick with the local player actions.
+        return False if it wasn't played : not started, or too far ahead of
+        the remote peer (the actions are dropped then, the remote catch up)
+        """
+        self._receive()
+        if self.match is None:
+            return False
+        if self.rollback_to is not None:
+            self._rollback()
+
+        if self.tick - self.confirmed >= self.max_rollback:
+            self.stalls += 1
+            self._send_actions()
+            return False
+        # time sync : both peers see the other late by the same latency, so half the
+        # difference of their advantages is how far ahead this one really is
+        if (self.advantage - self.remote_advantage) / 2 >= 1 and self.tick % SYNC_INTERVAL == 0:
+            self.waits += 1
+            self._send_actions()
+            return False
+
+        self.local_actions[self.tick + self.input_delay] = actions & 0xff
+        self._play(self.tick)
+        self.tick += 1
+        self._send_actions()
+        self._forget()
+        return True
+
+    @property
+    def advantage(self) -> int:
+        """ how many ticks the remote peer seem late """
+        return max(-128, min(127, self.tick - self.remote_tick))
+
+    def _play(self, tick: int) -> None:
+        """ play a tick, with the predicted remote actions if they are missing """
+        assert self.match is not None
+        self.states[tick] = self.match.get_state()
+        remote = self.remote_actions.get(tick)
+        if remote is None:
+            # predict the remote player keep doing the same
+            remote = self.remote_actions.get(self.confirmed - 1, 0)
+        self.used_actions[tick] = remote
+
+        actions = [0, 0]
+        actions[self.local_player] = self.local_actions[tick]
+        actions[1 - self.local_player] = remote
+        self.match.step(actions, dt=self.dt)
+
+    def _rollback(self) -> None:
+        """ go back to the first mispredicted tick and play again up to now """
+        assert self.match is not None and self.rollback_to is not None
+        start, self.rollback_to = self.rollback_to, None
+        self.match.set_state(self.states[start])
+
+        self.resimulating = True
+        for tick in range(start, self.tick):
+            self._play(tick)
+        self.resimulating = False
+
+        self.rollbacks += 1
+        self.rolled_back_ticks += self.tick - start
+        self.deepest_rollback = max(self.deepest_rollback, self.tick - start)
+
+    def _send_actions(self) -> None:
+        """ send every local action the remote peer is missing """
+        first = self.acked
+        end = min(self.tick + self.input_delay, first + MAX_INPUTS_PER_PACKET)
+        actions = bytes(self.local_actions[tick] for tick in range(first, end))
+        self.transport.send(
+            INPUTS_PACKET.pack(
+                INPUTS, self.confirmed, self.tick, self.advantage, first, len(actions),
+            ) + actions
+        )
+
+    def _forget(self) -> None:
+        """ drop what no rollback can need anymore """
+        final = min(self.confirmed, self.tick)
+        for tick in [tick for tick in self.states if tick < final]:
+            if tick % settings.NET_CHECKSUM_INTERVAL == 0:
+                self.checksums[tick] = digest_state(self.states[tick])
+            del self.states[tick]
+            del self.used_actions[tick]
+        # keep the last confirmed ones for the predictions
+        for tick in [tick for tick in self.remote_actions if tick < min(final, self.confirmed - 1)]:
+            del self.remote_actions[tick]
+        # still needed to play the ticks again, and by the remote peer
+        for tick in [tick for tick in self.local_actions if tick < min(final, self.acked)]:
+            del self.local_actions[tick]
+
+    @property
+    def confirmed_score(self) -> Score:
+        """ the score after the last tick played with the real remote actions,
+        no rollback can change it
+        """
+        assert self.match is not None
+        if self.tick <= self.confirmed:
+            return self.match.score
+        score = Score()
+        score.update(self.states[self.confirmed]['score'])
+        return score
+
+    @property
+    def rollback_frames(self) -> float:
+        """ average ticks played again per rollback """
+        return self.rolled_back_ticks / self.rollbacks if self.rollbacks else 0.0
+
+
+def main() -> None:
+    """ two scripted peers over a simulated link, check they end identical """
+    parser = argparse.ArgumentParser(description='rollback netcode over a simulated link')
+    parser.add_argument('--rtt', type=float, default=100, help='round trip time in ms')
+    parser.add_argument('--jitter', type=float, default=10, help='one way jitter in ms')
+    parser.add_argument('--loss', type=float, default=0.05, help='packet loss, 0 to 1')
+    parser.add_argument('--delay', type=int, default=settings.NET_INPUT_DELAY, help='input delay')
+    parser.add_argument('--ticks', type=int, default=60 * 60)
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args()
+
+    # simulated time, both peers run at exactly settings.SIM_HZ
+    now = [0.0]
+    links = loopback_pair(
+        clock=lambda: now[0],
+        latency=arguments.rtt / 2000,
+        jitter=arguments.jitter / 1000,
+        loss=arguments.loss,
+        seed=arguments.seed,
+    )
+    sessions = [
+        RollbackSession(links[0], host=True, seed=arguments.seed, input_delay=arguments.delay),
+        RollbackSession(links[1], host=False, input_delay=arguments.delay),
+    ]
+    # the players follow the ball their own peer show, and sometimes go
+    # their own way for a while, every change is a prediction to correct
+    controllers = [follow_ball(0), follow_ball(1)]
+    wander = random.Random(arguments.seed)
+    wandering: list[int | None] = [None, None]
+
+    while min(session.tick for session in sessions) < arguments.ticks:
+        now[0] += 1 / settings.SIM_HZ
+        for player, (session, controller) in enumerate(zip(sessions, controllers)):
+            if session.match is None:
+                if session.handshake() and session.seed is not None:
+                    session.start(Match(seed=session.seed, config=session.config))
+                continue
+            if wander.random() < 0.05:
+                wandering[player] = wander.choice([None, 0, Action.UP, Action.DOWN])
+            actions = wandering[player]
+            session.advance(controller(session.match) if actions is None else actions)
+
+    host, guest = sessions
+    assert host.match is not None
+    common = sorted(host.checksums.keys() & guest.checksums.keys())
+    diverged = [tick for tick in common if host.checksums[tick] != guest.checksums[tick]]
+    for name, session in (('host', host), ('guest', guest)):
+        print(
+            f'{name}: {session.tick} ticks, {session.rollbacks} rollbacks '
+            f'({session.rollback_frames:.1f} ticks on average, '
+            f'{session.deepest_rollback} at most), '
+            f'{session.stalls} stalls, {session.waits} waits to sync'
+        )
+    felt = arguments.delay * 1000 / settings.SIM_HZ
+    print(f'felt latency {arguments.delay} ticks ({felt:.0f} ms)')
+    if diverged or not common:
+        print(f'diverged at tick {diverged[0] if diverged else "?"}')
+        sys.exit(1)
+    print(f'identical on the {len(common)} checksummed ticks, score {host.match.score}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+""" seeded random numbers for the matches.
+random.Random keep 2.5 KB of Mersenne Twister state, more than everything
+else in a headless match, and get_state() copy it on every rollback.
+SplitMix64 keep a single int and is plenty for kickoffs and spawned balls.
+"""
+from collections.abc import Sequence
+from typing import TypeVar
+
+T = TypeVar('T')
+
+MASK = (1 << 64) - 1
+
+
+class MatchRandom:
+    """ the draws of a match, the same seed always give the same draws """
+    __slots__ = ('state',)
+
+    def __init__(self, seed: int) -> None:
+        self.state = seed & MASK
+
+    def next(self) -> int:
+        """ the next 64 bits draw """
+        self.state = state = (self.state + 0x9E3779B97F4A7C15) & MASK
+        state = ((state ^ (state >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+        state = ((state ^ (state >> 27)) * 0x94D049BB133111EB) & MASK
+        return state ^ (state >> 31)
+
+    def random(self) -> float:
+        """ a float in [0, 1) """
+        return (self.next() >> 11) * (1.0 / (1 << 53))
+
+    def uniform(self, low: float, high: float) -> float:
+        """ a float between low and high """
+        return low + (high - low) * self.random()
+
+    def choice(self, items: Sequence[T]) -> T:
+        """ one of the items """
+        return items[self.next() % len(items)]
+
+    def getstate(self) -> int:
+        """ the state, for setstate() """
+        return self.state
+
+    def setstate(self, state: int) -> None:
+        """ go back to a state from getstate() """
+        self.state = state
@@ -0,0 +1,188 @@
+""" frame profiler.
+The game time its phases (event, update, render, flip) and the match its
+entities with perf_counter_ns, the last settings.PROFILER_WINDOW samples of
+each phase give rolling percentiles. F3 show them over the game with a graph
+of the frame times, F4 export them to settings.PROFILE_DIR.
+"""
+from collections import deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+import csv
+import json
+import os
+import time
+import pygame
+import settings
+import assets
+
+# phases timed by the game, drawn in this order
+FRAME_PHASES = ('event', 'update', 'render', 'flip')
+GRAPH_COLORS = {
+    'event': '#ffff00',
+    'update': '#00ff00',
+    'render': '#00aaff',
+    'flip': '#ff00ff',
+}
+
+
+def percentile(ordered: list[int], fraction: float) -> int:
+    """ nearest rank percentile of sorted samples """
+    if not ordered:
+        return 0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class Profiler:
+    """ rolling samples by phase, in nanoseconds.
+    Disabled, measure() and add() cost a branch.
+    """
+
+    def __init__(self, window: int = settings.PROFILER_WINDOW, enabled: bool = True) -> None:
+        self.window = window
+        self.enabled = enabled
+        self.samples: dict[str, deque[int]] = {}
+        # the frame being timed, by phase. a phase can run many times a frame
+        self.frame: dict[str, int] = {}
+        self.frames: deque[dict[str, int]] = deque(maxlen=window)
+
+    def add(self, phase: str, duration: int) -> None:
+        """ one sample of a phase, in ns """
+        if not self.enabled:
+            return
+        samples = self.samples.get(phase)
+        if samples is None:
+            samples = self.samples[phase] = deque(maxlen=self.window)
+        samples.append(duration)
+        self.frame[phase] = self.frame.get(phase, 0) + duration
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """ time the block """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter_ns() - start)
+
+    def end_frame(self) -> None:
+        """ close the frame, its phases are one point of the graph """
+        if self.enabled:
+            self.frames.append(self.frame)
+            self.frame = {}
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """ count, mean, p50, p95, p99 and max of every phase, in ms """
+        stats: dict[str, dict[str, float]] = {}
+        for phase, samples in self.samples.items():
+            ordered = sorted(samples)
+            stats[phase] = {
+                'count': len(ordered),
+                'mean': sum(ordered) / len(ordered) / 1e6,
+                'p50': percentile(ordered, 0.50) / 1e6,
+                'p95': percentile(ordered, 0.95) / 1e6,
+                'p99': percentile(ordered, 0.99) / 1e6,
+                'max': ordered[-1] / 1e6,
+            }
+        return stats
+
+    def export(self, path: str) -> None:
+        """ write the stats, as csv or json by the extension.
+        The json also hold the raw samples, in ns.
+        """
+        stats = self.stats()
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='', encoding='utf-8') as file:
+                writer = csv.writer(file)
+                writer.writerow(
+                    ['phase', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'],
+                )
+                for phase, values in sorted(stats.items()):
+                    writer.writerow([phase, *values.values()])
+            return
+        document: dict[str, Any] = {
+            'stats_ms': stats,
+            'samples_ns': {phase: list(samples) for phase, samples in self.samples.items()},
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(document, file, indent=1)
+
+    def export_all(self) -> list[str]:
+        """ csv and json in settings.PROFILE_DIR, return their paths """
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        name = os.path.join(settings.PROFILE_DIR, time.strftime('%Y%m%d-%H%M%S'))
+        paths = [f'{name}.csv', f'{name}.json']
+        for path in paths:
+            self.export(path)
+        return paths
+
+
+class Overlay:
+    """ the stats and the frame graph, drawn over the game.
+    The text is composed again every settings.PROFILER_REFRESH frames only,
+    the percentiles sort every sample.
+    """
+
+    def __init__(self, profiler: Profiler) -> None:
+        self.profiler = profiler
+        self.visible = False
+        self.font = assets.font(settings.MONO_FONT_NAME, settings.PROFILER_FONT_SIZE)
+        self.text: pygame.Surface | None = None
+        self.frames_since_text = 0
+
+    def toggle(self) -> None:
+        """ show or hide, the profiler only run while shown unless settings.PROFILER """
+        self.visible = not self.visible
+        self.profiler.enabled = self.visible or settings.PROFILER
+        self.text = None
+
+    def _render_text(self, lines: list[str]) -> pygame.Surface:
+        """ the stats table and the lines, on a translucent background """
+        stats = self.profiler.stats()
+        rows = [*lines, f'{"phase":<16}{"p50":>7}{"p95":>7}{"p99":>7} ms']
+        for phase in sorted(stats):
+            values = stats[phase]
+            rows.append(
+                f'{phase:<16}{values["p50"]:>7.2f}{values["p95"]:>7.2f}{values["p99"]:>7.2f}'
+            )
+        glyphs = assets.glyphs(self.font, settings.PROFILER_COLOR)
+        images = [glyphs.render(row) for row in rows]
+        height = self.font.get_linesize()
+        surface = pygame.Surface(
+            (max(image.width for image in images) + 8, height * len(images) + 8),
+        )
+        surface.set_alpha(settings.TRANSPARENCY_ALPHA)
+        for index, image in enumerate(images):
+            surface.blit(image, (4, 4 + index * height))
+        return surface
+
+    def render(self, canvas: pygame.Surface, lines: list[str]) -> None:
+        """ draw the overlay, lines are shown above the stats """
+        if self.text is None or self.frames_since_text >= settings.PROFILER_REFRESH:
+            self.text = self._render_text(lines)
+            self.frames_since_text = 0
+        self.frames_since_text += 1
+        canvas.blit(self.text, (0, 0))
+        self._render_graph(canvas)
+
+    def _render_graph(self, canvas: pygame.Surface) -> None:
+        """ one bar per frame, a segment per phase, under the 60 fps line """
+        frames = self.profiler.frames
+        if not frames:
+            return
+        height = settings.PROFILER_GRAPH_HEIGHT
+        bottom = canvas.height - 1
+        # px per ns, a 60 fps frame take two thirds of the graph
+        scale = height * 2 / 3 / (1e9 / 60)
+        left = canvas.width - len(frames)
+        for x, frame in enumerate(frames, start=left):
+            y = float(bottom)
+            for phase in FRAME_PHASES:
+                top = max(y - frame.get(phase, 0) * scale, bottom - height)
+                pygame.draw.line(canvas, GRAPH_COLORS[phase], (x, y), (x, top))
+                y = top
+        budget = bottom - height * 2 / 3
+        pygame.draw.line(canvas, settings.PROFILER_COLOR, (left, budget), (canvas.width, budget))
@@ -0,0 +1,202 @@
+""" replays of matches.
+A match is deterministic, so a replay is only its seed, its MatchConfig
+and the actions of every tick (one byte per player per tick).
+Playing them again on a headless match give back the same match bit for bit,
+as fast as the cpu allow.
+
+python replay.py replays/<file>.replay [--seek TICK]
+"""
+from collections.abc import Sequence
+from typing import Any
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+import settings
+from config import MatchConfig
+from simulation import Match
+
+MAGIC = b'FOOSRPL'
+VERSION = 2  # 2 : the match draws come from prng.MatchRandom
+# magic, version, length of the json header
+HEADER = struct.Struct('<7sHI')
+
+def digest_state(state: dict[str, Any]) -> str:
+    """ hash of a Match.get_state(), equal only for bit exact matches """
+    return hashlib.sha1(repr(sorted(state.items())).encode()).hexdigest()
+
+
+def digest(match: Match) -> str:
+    """ hash of the whole match state """
+    return digest_state(match.get_state())
+
+
+class Replay:
+    """ seed, config and actions of a match.
+    digest is the hash of the match once every tick was played, if known
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        dt: float = 1.0,
+        players: int = settings.PLAYERS,
+        config: MatchConfig | None = None,
+        actions: bytes = b'',
+        end_digest: str | None = None,
+    ) -> None:
+        self.seed = seed
+        self.dt = dt
+        self.players = players
+        self.config = MatchConfig.from_settings() if config is None else config
+        self.actions = bytearray(actions)
+        self.end_digest = end_digest
+
+    @property
+    def ticks(self) -> int:
+        """ number of recorded ticks """
+        return len(self.actions) // self.players
+
+    def tick_actions(self, tick: int) -> bytes:
+        """ the action bitmask of every player for this tick """
+        return bytes(self.actions[tick * self.players:(tick + 1) * self.players])
+
+    def match(self) -> Match:
+        """ a new headless match at the first tick """
+        return Match(seed=self.seed, config=self.config)
+
+    def save(self, path: str) -> None:
+        """ write the replay to a file, the actions are zlib compressed """
+        header = json.dumps({
+            'seed': self.seed,
+            'dt': self.dt,
+            'players': self.players,
+            'physics': self.config.as_settings(),
+            'digest': self.end_digest,
+        }).encode()
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(header)))
+            file.write(header)
+            file.write(zlib.compress(self.actions))
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        """ read a file written by save() """
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, version, length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} replay')
+        header = json.loads(data[HEADER.size:HEADER.size + length])
+        # json turned the tuples into lists, the settings missing from older
+        # replays are not read by the simulation, they keep their current value
+        physics = {
+            name: tuple(value) if isinstance(value, list) else value
+            for name, value in header['physics'].items()
+        }
+        return cls(
+            seed=header['seed'],
+            dt=header['dt'],
+            players=header['players'],
+            config=MatchConfig.from_settings().with_settings(physics),
+            actions=zlib.decompress(data[HEADER.size + length:]),
+            end_digest=header['digest'],
+        )
+
+
+class Recorder:
+    """ step a match and record its actions.
+    The match must be new, a replay start from the seed.
+    """
+
+    def __init__(self, match: Match, dt: float = 1.0) -> None:
+        self.match = match
+        self.replay = Replay(
+            seed=match.seed, dt=dt, players=len(match.paddles), config=match.config,
+        )
+
+    def step(self, actions: Sequence[int]) -> None:
+        """ record then play one tick """
+        self.replay.actions.extend(action & 0xff for action in actions)
+        self.match.step(actions, dt=self.replay.dt)
+
+    def save(self, path: str) -> None:
+        """ save everything recorded so far, with the digest of the match """
+        self.replay.end_digest = digest(self.match)
+        self.replay.save(path)
+
+
+def prune(directory: str, keep: int) -> None:
+    """ delete the replays of directory but the keep newest, by file name """
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.replay'))
+    for name in names[:max(0, len(names) - keep)]:
+        os.remove(os.path.join(directory, name))
+
+
+class Player:
+    """ play a replay on a headless match.
+    A snapshot of the match is kept every keyframe_interval ticks on the way,
+    so seek() never replay more than that many ticks.
+    """
+
+    def __init__(
+        self,
+        replay: Replay,
+        keyframe_interval: int = settings.REPLAY_KEYFRAME_INTERVAL,
+    ) -> None:
+        self.replay = replay
+        self.keyframe_interval = keyframe_interval
+        self.match = replay.match()
+        self.keyframes: dict[int, dict[str, Any]] = {0: self.match.get_state()}
+
+    @property
+    def finished(self) -> bool:
+        """ True once every recorded tick was played """
+        return self.match.ticks >= self.replay.ticks
+
+    def play(self, until: int | None = None) -> Match:
+        """ play up to the tick until, or the end """
+        end = self.replay.ticks if until is None else min(until, self.replay.ticks)
+        match, replay = self.match, self.replay
+        while match.ticks < end:
+            match.step(replay.tick_actions(match.ticks), dt=replay.dt)
+            if match.ticks % self.keyframe_interval == 0:
+                self.keyframes.setdefault(match.ticks, match.get_state())
+        return match
+
+    def seek(self, tick: int) -> Match:
+        """ go to any tick, from the closest keyframe before it """
+        keyframe = max(known for known in self.keyframes if known <= tick)
+        if not keyframe <= self.match.ticks <= tick:
+            self.match.set_state(self.keyframes[keyframe])
+        return self.play(until=tick)
+
+
+def main() -> None:
+    """ play a replay file headless and check it end like the recording """
+    parser = argparse.ArgumentParser(description='play a replay as fast as possible')
+    parser.add_argument('path')
+    parser.add_argument('--seek', type=int, help='stop at this tick')
+    arguments = parser.parse_args()
+
+    replay = Replay.load(arguments.path)
+    player = Player(replay)
+    start = time.perf_counter()
+    match = player.play(until=arguments.seek)
+    elapsed = time.perf_counter() - start
+
+    print(f'tick {match.ticks}/{replay.ticks} score {match.score} balls {len(match.balls)}')
+    print(f'{match.ticks / elapsed if elapsed else 0:.0f} ticks/s')
+    if player.finished and replay.end_digest is not None:
+        if digest(match) != replay.end_digest:
+            print('diverged from the recording')
+            sys.exit(1)
+        print('identical to the recording')
+
+
+if __name__ == '__main__':
+    main()
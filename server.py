@@ -0,0 +1,518 @@
+""" authoritative headless match server.
+Many matches run in one asyncio event loop, the clients only send their held
+actions and receive the match state. A client joining is paired with the
+next one, their match tick at settings.SIM_HZ on its own schedule.
+
+Every state is sent as a quantized snapshot.py delta against the last state
+the client acknowledged (a full snapshot when there is none), most of the
+bytes don't change between two ticks so the packets stay small.
+
+python server.py [--port 7778] [--workers N] : serve, N processes each
+serving on its own port, the base port only redirect the clients
+python server.py --bots 400 [--address 127.0.0.1:7778] : load test
+"""
+from collections import OrderedDict
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, cast
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+import socket
+import statistics
+import struct
+import time
+import settings
+from config import MatchConfig
+from simulation import Match
+from snapshot import Snapshot, DeltaEncoder, Decoded, read
+from inputs import Action, MOVES
+
+# packet kinds. client : JOIN until WELCOME, then INPUTS every tick.
+# server : WELCOME, STATE, END once the match is over, REDIRECT to a shard
+JOIN = 0
+WELCOME = 1
+INPUTS = 2
+STATE = 3
+END = 4
+REDIRECT = 5
+FULL = 6
+# kind
+KIND_PACKET = struct.Struct('<B')
+# kind, match id, player, seed
+WELCOME_PACKET = struct.Struct('<BIBI')
+# kind, match id, last state tick received (ack), held actions
+INPUTS_PACKET = struct.Struct('<BIIB')
+# kind, tick, baseline tick (the tick itself for a full snapshot), then the snapshot or the delta
+STATE_PACKET = struct.Struct('<BII')
+# kind, port
+REDIRECT_PACKET = struct.Struct('<BH')
+
+@dataclass(eq=False)
+class Client:
+    """ a player seen by the server """
+    address: tuple[str, int]
+    player: int
+    actions: int = 0
+    last_seen: float = 0.0
+    # ticks of the states sent, the acked one is the next baseline
+    sent: 'OrderedDict[int, bytes]' = field(default_factory=OrderedDict)
+    acked: int | None = None
+
+
+@dataclass(eq=False)
+class HostedMatch:
+    """ a match and its players, ticking once every players joined """
+    match_id: int
+    seed: int
+    match: Match
+    clients: list[Client] = field(default_factory=list)
+    next_tick: float = 0.0
+    finished: bool = False
+
+
+@dataclass
+class Metrics:
+    """ counters since the last report """
+    ticks: int = 0
+    late_ticks: int = 0
+    dropped_ticks: int = 0
+    packets_in: int = 0
+    packets_out: int = 0
+    bytes_out: int = 0
+    skipped_sends: int = 0
+    step_times: list[float] = field(default_factory=list)
+
+    def report(self, elapsed: float, matches: int, players: int) -> str:
+        """ one line summary, per second """
+        step_times = sorted(self.step_times) or [0.0]
+        p99 = step_times[min(len(step_times) - 1, int(len(step_times) * 0.99))]
+        return (
+            f'{matches} matches {players} players | '
+            f'{self.ticks / elapsed:.0f} ticks/s, {self.late_ticks} late, '
+            f'{self.dropped_ticks} dropped | '
+            f'step {statistics.fmean(step_times) * 1e6:.0f} us (p99 {p99 * 1e6:.0f}) | '
+            f'in {self.packets_in / elapsed:.0f} pkt/s, out {self.packets_out / elapsed:.0f} pkt/s '
+            f'{self.bytes_out / elapsed / 1024:.0f} KiB/s, {self.skipped_sends} skipped'
+        )
+
+
+class MatchServer(asyncio.DatagramProtocol):  # pylint: disable=too-many-instance-attributes
+    """ host the matches, one scheduler step every match when its tick is due.
+    The matches are kept in a heap by next tick, the loop only wake up for the
+    earliest one, so idle matches cost nothing and the ticks of the matches are
+    spread over the frame (they tick from the time they started).
+    Every match is played with config, the settings by default.
+    """
+
+    def __init__(self, config: MatchConfig | None = None) -> None:
+        self.config = MatchConfig.from_settings() if config is None else config
+        self.transport: asyncio.DatagramTransport | None = None
+        self.matches: dict[int, HostedMatch] = {}
+        self.clients: dict[tuple[str, int], tuple[HostedMatch, Client]] = {}
+        self.waiting: HostedMatch | None = None
+        self.schedule: list[tuple[float, int]] = []
+        self.match_ids = itertools.count(1)
+        self.wake_up = asyncio.Event()
+        # the socket buffer is full, skip the states until it drain (they are deltas
+        # against the acked state, so any of them can be skipped)
+        self.paused = False
+        self.metrics = Metrics()
+        # scratch buffers shared by every match
+        self.snapshot = Snapshot(quantized=True, config=self.config)
+        self.deltas = DeltaEncoder(self.config, quantized=True)
+
+    # asyncio.DatagramProtocol
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def pause_writing(self) -> None:
+        self.paused = True
+
+    def resume_writing(self) -> None:
+        self.paused = False
+
+    def error_received(self, exc: Exception) -> None:
+        """ a client went away (ICMP unreachable), its timeout end the match """
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        self.metrics.packets_in += 1
+        if not data:
+            return
+        known = self.clients.get(addr)
+        if data[0] == INPUTS and len(data) == INPUTS_PACKET.size and known is not None:
+            hosted, client = known
+            _, match_id, acked, actions = INPUTS_PACKET.unpack(data)
+            if match_id != hosted.match_id:
+                return
+            client.actions = actions & MOVES
+            client.last_seen = time.monotonic()
+            if acked in client.sent and (client.acked is None or acked > client.acked):
+                client.acked = acked
+        elif data[0] == JOIN:
+            if known is None:
+                known = self.join(addr)
+            if known is None:
+                self.send(KIND_PACKET.pack(FULL), addr)
+                return
+            hosted, client = known
+            self.send(
+                WELCOME_PACKET.pack(WELCOME, hosted.match_id, client.player, hosted.seed), addr,
+            )
+
+    def send(self, data: bytes, addr: tuple[str, int]) -> None:
+        """ send a datagram, counted """
+        assert self.transport is not None
+        self.transport.sendto(data, addr)
+        self.metrics.packets_out += 1
+        self.metrics.bytes_out += len(data)
+
+    def join(self, addr: tuple[str, int]) -> tuple[HostedMatch, Client] | None:
+        """ add a player to the waiting match, or open a new one. None when full """
+        hosted = self.waiting
+        if hosted is None:
+            if len(self.matches) >= settings.SERVER_MAX_MATCHES:
+                return None
+            seed = random.randrange(2 ** 32)
+            hosted = HostedMatch(next(self.match_ids), seed, Match(seed=seed, config=self.config))
+            self.matches[hosted.match_id] = hosted
+            self.waiting = hosted
+
+        client = Client(addr, player=len(hosted.clients), last_seen=time.monotonic())
+        hosted.clients.append(client)
+        self.clients[addr] = (hosted, client)
+
+        if len(hosted.clients) == len(hosted.match.paddles):
+            self.waiting = None
+            hosted.next_tick = time.monotonic()
+            heapq.heappush(self.schedule, (hosted.next_tick, hosted.match_id))
+            self.wake_up.set()
+        return hosted, client
+
+    async def run(self) -> None:
+        """ tick the due matches forever """
+        period = 1 / settings.SIM_HZ
+        dt = settings.REFERENCE_HZ / settings.SIM_HZ
+        while True:
+            if not self.schedule:
+                self.wake_up.clear()
+                await self.wake_up.wait()
+                continue
+            due, match_id = self.schedule[0]
+            now = time.monotonic()
+            if due > now:
+                self.wake_up.clear()
+                try:
+                    await asyncio.wait_for(self.wake_up.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self.schedule)
+            hosted = self.matches.get(match_id)
+            if hosted is None:
+                continue
+            # catch up like Game.main_loop, give up the ticks past MAX_CATCHUP_STEPS
+            steps = 0
+            while hosted.next_tick <= now and steps < settings.MAX_CATCHUP_STEPS:
+                self.tick(hosted, dt)
+                hosted.next_tick += period
+                steps += 1
+            if steps > 1:
+                self.metrics.late_ticks += steps - 1
+            if hosted.next_tick <= now:
+                dropped = int((now - hosted.next_tick) / period) + 1
+                self.metrics.dropped_ticks += dropped
+                hosted.next_tick += dropped * period
+
+            self.check_clients(hosted, now)
+            if hosted.finished:
+                self.close(hosted)
+            else:
+                heapq.heappush(self.schedule, (hosted.next_tick, match_id))
+
+            # let the datagrams in between two matches
+            await asyncio.sleep(0)
+
+    def tick(self, hosted: HostedMatch, dt: float) -> None:
+        """ step a match with the last actions of its players, send the state """
+        start = time.perf_counter()
+        hosted.match.step([client.actions for client in hosted.clients], dt=dt)
+        self.metrics.step_times.append(time.perf_counter() - start)
+        self.metrics.ticks += 1
+
+        hosted.finished = hosted.match.winner is not None
+        if hosted.match.ticks % settings.SERVER_SEND_INTERVAL and not hosted.finished:
+            return
+        if self.paused:
+            self.metrics.skipped_sends += len(hosted.clients)
+            return
+        state = bytes(self.snapshot.capture(hosted.match))
+        for client in hosted.clients:
+            self.send_state(client, hosted.match.ticks, state)
+
+    def send_state(self, client: Client, tick: int, state: bytes) -> None:
+        """ delta against the acked state, full state if there is none """
+        baseline_tick = tick
+        payload: bytes | memoryview = state
+        if client.acked is not None and client.acked in client.sent:
+            baseline_tick = client.acked
+            payload = self.deltas.encode(state, client.sent[client.acked])
+        self.send(STATE_PACKET.pack(STATE, tick, baseline_tick) + payload, client.address)
+
+        client.sent[tick] = state
+        # forget the states older than the acked one, and cap what an unresponsive client cost
+        while client.sent and (
+            len(client.sent) > settings.SERVER_STATE_HISTORY
+            or (client.acked is not None and next(iter(client.sent)) < client.acked)
+        ):
+            client.sent.popitem(last=False)
+
+    def check_clients(self, hosted: HostedMatch, now: float) -> None:
+        """ a match end when one of its players is gone """
+        timeout = settings.SERVER_CLIENT_TIMEOUT
+        if any(now - client.last_seen > timeout for client in hosted.clients):
+            hosted.finished = True
+
+    def close(self, hosted: HostedMatch) -> None:
+        """ tell the players and forget the match """
+        for client in hosted.clients:
+            self.send(KIND_PACKET.pack(END), client.address)
+            del self.clients[client.address]
+        del self.matches[hosted.match_id]
+
+    def drop_stale_waiting(self, now: float) -> None:
+        """ a player waiting alone for too long left """
+        hosted = self.waiting
+        if hosted is not None and all(
+            now - client.last_seen > settings.SERVER_CLIENT_TIMEOUT for client in hosted.clients
+        ):
+            self.waiting = None
+            self.close(hosted)
+
+    async def report(self, interval: float, name: str) -> None:
+        """ print the metrics every interval seconds """
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self.drop_stale_waiting(now)
+            metrics, self.metrics = self.metrics, Metrics()
+            report = metrics.report(now - start, len(self.matches), len(self.clients))
+            print(name, report, flush=True)
+
+
+class Lobby(asyncio.DatagramProtocol):
+    """ send the clients to the shards, two by two so they play together """
+
+    def __init__(self, ports: list[int]) -> None:
+        self.ports = ports
+        self.transport: asyncio.DatagramTransport | None = None
+        # the JOIN are repeated until answered, answer the same port
+        self.assigned: 'OrderedDict[tuple[str, int], int]' = OrderedDict()
+        self.joined = 0
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        self.transport = cast(asyncio.DatagramTransport, transport)
+
+    def datagram_received(self, data: bytes, addr: tuple[str, int]) -> None:
+        if data[:1] != KIND_PACKET.pack(JOIN) or self.transport is None:
+            return
+        port = self.assigned.get(addr)
+        if port is None:
+            port = self.ports[self.joined // 2 % len(self.ports)]
+            self.joined += 1
+            self.assigned[addr] = port
+            if len(self.assigned) > 4096:
+                self.assigned.popitem(last=False)
+        self.transport.sendto(REDIRECT_PACKET.pack(REDIRECT, port), addr)
+
+
+async def serve(port: int, name: str = 'server') -> None:
+    """ host matches on this udp port forever """
+    loop = asyncio.get_running_loop()
+    _, server = await loop.create_datagram_endpoint(MatchServer, local_addr=('0.0.0.0', port))
+    assert isinstance(server, MatchServer)
+    print(f'{name} listening on udp {port}', flush=True)
+    await asyncio.gather(server.run(), server.report(settings.SERVER_METRICS_INTERVAL, name))
+
+
+def run_shard(port: int) -> None:
+    """ a worker process of serve_sharded() """
+    asyncio.run(serve(port, name=f'shard {port}'))
+
+
+async def serve_sharded(port: int, workers: int) -> None:
+    """ workers processes serve on the following ports, this one redirect the clients """
+    ports = [port + 1 + index for index in range(workers)]
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        shards = [loop.run_in_executor(pool, run_shard, shard) for shard in ports]
+        await loop.create_datagram_endpoint(lambda: Lobby(ports), local_addr=('0.0.0.0', port))
+        print(f'lobby listening on udp {port}', flush=True)
+        await asyncio.gather(*shards)
+
+
+class ServerClient:  # pylint: disable=too-many-instance-attributes
+    """ non blocking client of a MatchServer.
+    join() until joined, then send_actions() and receive() every tick,
+    state is the last state received, of a match played with config (the settings
+    by default, like MatchServer).
+    """
+
+    def __init__(self, address: tuple[str, int], config: MatchConfig | None = None) -> None:
+        self.config = MatchConfig.from_settings() if config is None else config
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('', 0))
+        self.socket.setblocking(False)
+        self.address = address
+        self.match_id: int | None = None
+        self.player = 0
+        self.seed = 0
+        self.state: Decoded | None = None
+        self.finished = False
+        # raw states by tick, the baselines of the next deltas
+        self.received: 'OrderedDict[int, bytes]' = OrderedDict()
+        self.last_tick = 0
+        self.deltas = DeltaEncoder(self.config, quantized=True)
+
+    @property
+    def joined(self) -> bool:
+        """ True once the server put us in a match """
+        return self.match_id is not None
+
+    def join(self) -> None:
+        """ ask for a match, repeat until joined """
+        self._send(KIND_PACKET.pack(JOIN))
+
+    def send_actions(self, actions: int) -> None:
+        """ the actions held now, and the ack of the last state """
+        if self.match_id is not None:
+            self._send(INPUTS_PACKET.pack(INPUTS, self.match_id, self.last_tick, actions & 0xff))
+
+    def _send(self, data: bytes) -> None:
+        try:
+            self.socket.sendto(data, self.address)
+        except OSError:
+            # the server is not there yet, the next packets repeat this one
+            pass
+
+    def receive(self) -> None:
+        """ read every packet, keep the newest state """
+        while True:
+            try:
+                data, address = self.socket.recvfrom(4096)
+            except (BlockingIOError, ConnectionResetError):
+                return
+            if address != self.address or not data:
+                continue
+            if data[0] == STATE and len(data) > STATE_PACKET.size:
+                self._on_state(data)
+            elif data[0] == WELCOME and len(data) == WELCOME_PACKET.size:
+                _, self.match_id, self.player, self.seed = WELCOME_PACKET.unpack(data)
+            elif data[0] == REDIRECT and len(data) == REDIRECT_PACKET.size:
+                _, port = REDIRECT_PACKET.unpack(data)
+                self.address = (self.address[0], port)
+                self.join()
+            elif data[0] == END:
+                self.finished = True
+
+    def _on_state(self, data: bytes) -> None:
+        """ decode a state, drop the late ones and those with an unknown baseline """
+        _, tick, baseline_tick = STATE_PACKET.unpack_from(data)
+        if tick <= self.last_tick:
+            return
+        payload = data[STATE_PACKET.size:]
+        if baseline_tick != tick:
+            baseline = self.received.get(baseline_tick)
+            if baseline is None:
+                return
+            payload = bytes(self.deltas.decode(payload, baseline))
+        self.received[tick] = payload
+        self.last_tick = tick
+        while len(self.received) > settings.SERVER_STATE_HISTORY:
+            self.received.popitem(last=False)
+        self.state = read(payload)
+
+    def close(self) -> None:
+        """ release the port """
+        self.socket.close()
+
+
+def follow_ball(client: ServerClient) -> int:
+    """ scripted player of a bot, see simulation.follow_ball """
+    state = client.state
+    if state is None or not state.balls:
+        return 0
+    config = client.config
+    paddle_y = state.paddles[client.player][1] + config.paddle_size[1] / 2
+    ball_y = state.balls[0][1] + config.ball_size[1] / 2
+    if ball_y < paddle_y - config.paddle_speed:
+        return Action.UP
+    if ball_y > paddle_y + config.paddle_speed:
+        return Action.DOWN
+    return 0
+
+
+async def run_bots(
+    address: tuple[str, int],
+    count: int,
+    duration: float,
+    controller: Callable[[ServerClient], int] = follow_ball,
+    config: MatchConfig | None = None,
+) -> dict[str, Any]:
+    """ count clients play for duration seconds on a server playing config, return what they saw """
+    clients = [ServerClient(address, config) for _ in range(count)]
+    states = 0
+    end = time.monotonic() + duration
+    next_frame = time.monotonic()
+    while time.monotonic() < end:
+        for client in clients:
+            previous = client.last_tick
+            client.receive()
+            states += client.last_tick != previous
+            if not client.joined:
+                client.join()
+                continue
+            client.send_actions(controller(client))
+        next_frame += 1 / settings.SIM_HZ
+        await asyncio.sleep(max(0.0, next_frame - time.monotonic()))
+    for client in clients:
+        client.close()
+    return {
+        'joined': sum(client.joined for client in clients),
+        'finished': sum(client.finished for client in clients),
+        'states per client per second': states / count / duration,
+    }
+
+
+def main() -> None:
+    """ serve, or load test a server with bots """
+    parser = argparse.ArgumentParser(description='headless match server')
+    parser.add_argument('--port', type=int, default=settings.SERVER_PORT)
+    parser.add_argument('--workers', type=int, default=1, help='server processes')
+    parser.add_argument('--bots', type=int, help='load test a server with that many clients')
+    parser.add_argument(
+        '--address', default=f'127.0.0.1:{settings.SERVER_PORT}', help='of the server to test',
+    )
+    parser.add_argument('--duration', type=float, default=30, help='of the load test, in seconds')
+    arguments = parser.parse_args()
+
+    if arguments.bots:
+        host, _, port = arguments.address.partition(':')
+        seen = asyncio.run(run_bots(
+            (host, int(port or settings.SERVER_PORT)), arguments.bots, arguments.duration,
+        ))
+        for name, value in seen.items():
+            print(f'{name}: {value:.1f}' if isinstance(value, float) else f'{name}: {value}')
+    elif arguments.workers > 1:
+        asyncio.run(serve_sharded(arguments.port, arguments.workers))
+    else:
+        asyncio.run(serve(arguments.port))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,19 @@ from typing import NewType
 Color = NewType('Color', str)
 
 
-# global score
-score: dict[str, int] = {'RIGHT': 0, 'LEFT': 0,}
-
-
 # debugs
 CHEATS = True
 SHOW_HITBOX = True           # draw the rect
 SHOW_DIRECTIONS = True       # draw a line
 INVISIBILITY = CHEATS      # dont die
-DEBUG_POS = False
-DEBUG_STACK = False           # print stack
-DEBUG_SCORE = False          # print score and highscore
+
+# profiler, F3 show the overlay, F4 export, see profiler.py
+PROFILER = False             # time the frames even when the overlay is hidden
+PROFILER_WINDOW = 300        # frames the percentiles are computed on
+PROFILER_REFRESH = 15        # frames between two renders of the overlay text
+PROFILER_GRAPH_HEIGHT = 100  # px
+PROFILER_FONT_SIZE = 14
+PROFILE_DIR = 'profiles'
 
 WIN_SCORE = 10
 
@@ -23,7 +24,16 @@ WIN_SCORE = 10
 WIDTH = 1024
 HEIGHT = 512
 
-FPS = 60
+FPS = 60                # render cap, 0 render as fast as possible
+
+# simulation, run at a fixed rate whatever the render rate is
+SIM_HZ = 60             # physics ticks per second
+MAX_CATCHUP_STEPS = 5   # ticks per frame at most, the game slow down past that
+REFERENCE_HZ = 60       # speeds are in px per 1/60 second, like the original per frame speeds
+
+# static screens (menus) sleep on the event queue instead of redrawing
+IDLE_WAIT = True
+IDLE_WAIT_TIMEOUT = 1000  # ms, wake up at least that often
 
 WIDTH_BACKUP = WIDTH
 HEIGHT_BACKUP = HEIGHT
@@ -36,22 +46,48 @@ GOAL_TOP = HEIGHT * 0.1
 GOAL_BOTTOM = HEIGHT * 0.9
 
 
-# keys
-# pylint: disable=too-few-public-methods
-class P1Keys:
-    """ hold the keybinds of the player 1 """
-    RIGHT = 'd'
-    LEFT = 'a'
-    UP = 'w'
-    DOWN = 's'
+# players, their bindings are in inputs.py
+PLAYERS = 2
+
+# computer players, see ai.py. --ai on the command line add one
+AI_PLAYERS: tuple[int, ...] = ()
+# reaction in ticks, aim error in paddle half heights, by difficulty
+AI_DIFFICULTIES: dict[str, dict[str, float]] = {
+    'hard': {'reaction': 6, 'aim_error': 1.1},
+    'normal': {'reaction': 12, 'aim_error': 1.3},
+    'easy': {'reaction': 20, 'aim_error': 1.6},
+    'chaos': {'reaction': 12, 'aim_error': 1.3},
+}
+
+
+# replays, off by default (python main.py --record) : every finished match
+# is saved in REPLAY_DIR, only the REPLAY_KEEP newest are kept
+RECORD_REPLAYS = False
+REPLAY_DIR = 'replays'
+REPLAY_KEEP = 20
+REPLAY_KEYFRAME_INTERVAL = 600  # ticks between two snapshots, to seek fast
+
+
+# online, see netcode.py
+NET_PORT = 7777
+NET_INPUT_DELAY = 2         # ticks, the local actions are applied that late
+NET_MAX_ROLLBACK = 8        # ticks, wait for the remote player past that
+NET_CHECKSUM_INTERVAL = 60  # ticks between two compared states
+NET_CONNECT_TIMEOUT = 30    # seconds
 
-class P2Keys:
-    """ hold the keybinds of the player 2 """
-    RIGHT = 'RIGHT'
-    LEFT = 'LEFT'
-    UP = 'UP'
-    DOWN = 'DOWN'
-# pylint: enable=too-few-public-methods
+# match server, see server.py
+SERVER_PORT = 7778
+SERVER_MAX_MATCHES = 1000
+SERVER_SEND_INTERVAL = 2      # ticks between two states sent to the clients
+SERVER_STATE_HISTORY = 32     # states kept per client as delta baselines
+SERVER_CLIENT_TIMEOUT = 10    # seconds, the match end without news of a player
+SERVER_METRICS_INTERVAL = 5   # seconds between two printed reports
+
+
+# sound
+SOUND = True                # False never start the mixer
+SOUND_CHANNELS = 8
+SOUND_MIN_INTERVAL = 0.03   # in second, an effect can't play more often
 
 
 # BACKGROUND COLORS
@@ -65,20 +101,55 @@ HITBOX_COLOR = Color('#ff0000')
 DIRECTION_COLOR = Color('#0000ff')
 TRANSPARENCY_ALPHA = 150
 SCORE_COLOR = '#ffffff'
+LOADING_BAR_COLOR = Color('#ffffff')
+PROFILER_COLOR = Color('#ffffff')
 
 # default font. There also is a bold and a mono variant.
 FONT_NAME = 'font/PixeloidSans.ttf'
+BOLD_FONT_NAME = 'font/PixeloidSansBold.ttf'
+MONO_FONT_NAME = 'font/PixeloidMono.ttf'
 FONT_SIZE = 30
+BOLD_FONT_SIZE = 35
+BIG_FONT_SIZE = 80
+SCORE_FONT_SIZE = 50
 FONT_COLOR = Color('#000000')
 
+# every font used, preloaded at startup
+FONTS = [
+    (FONT_NAME, FONT_SIZE),
+    (BOLD_FONT_NAME, BOLD_FONT_SIZE),
+    (BOLD_FONT_NAME, BIG_FONT_SIZE),
+    (BOLD_FONT_NAME, SCORE_FONT_SIZE),
+    (MONO_FONT_NAME, PROFILER_FONT_SIZE),
+]
+
+# images
+PADDLE_IMAGE = 'assets/Paddles/Neo/Neo_Paddle_128x28.png'
+BALL_IMAGE = 'assets/Balls/Glass/Ball_Blue_Glass-32x32.png'
+FIELD_IMAGE = 'assets/Field/field3.png'
+SPLASH_IMAGE = 'assets/Startup/foosball_005.png'
+COLORKEY = '#ff00ff'
+
 
 # entities
 MAX_BALLS = 10
+CHAOS = False  # every paddle hit of the match ball spawn BALL_MULTIPLYER more balls
+
+BROADPHASE_CELL_SIZE = 64  # px, about two balls wide
+
+# rotated ball images are cached, one per angle bucket
+ROTATION_BUCKETS = 64
+ROTATION_CACHE_BYTES = 4 * 1024 * 1024
 
 
 BALL_RADIUS = 8
 
+# hitboxes, match the images so entities can live without them (headless)
+PADDLE_SIZE = (28, 128)  # Neo_Paddle_128x28 rotated by 90 degrees
+BALL_SIZE = (32, 32)
+
 # those are change for each difficulty, default is normal difficulty.
+# a match read them through its config.MatchConfig
 ####################################################################
 POWERUP_BIG_PADLLE_DURATION = 10  # in second
 POWERUP_SPEED = 2
@@ -93,3 +164,68 @@ MAX_BOUNCE_ANGLE = 60
 
 BALL_SPEED = 7
 PADDLE_SPEED = 8
+
+
+# the presets of the Difficulties menu, also swept by sweep.py
+DIFFICULTIES: dict[str, dict[str, int | float | bool]] = {
+    'hard': {
+        'BALL_SPEED': 6,
+        'PADDLE_SPEED': 7,
+        'POWERUP_SPEED': 5,
+        'POWERUP_BIG_PADLLE_DURATION': 5,
+        'BALL_MULTIPLYER': 1,
+        'MAX_BOUNCE_ANGLE': 120,
+        'POWERUP_PADDLE_CHANCE': 7,
+        'POWERUP_BALL_CHANCE': 3,
+        'POWERUP_PADDLE_SIZE': 1.1,
+        'MAX_BALLS': 10,
+        'CHAOS': False,
+    },
+    'normal': {
+        'BALL_SPEED': 5,
+        'PADDLE_SPEED': 8,
+        'POWERUP_SPEED': 2,
+        'POWERUP_BIG_PADLLE_DURATION': 10,
+        'BALL_MULTIPLYER': 2,
+        'MAX_BOUNCE_ANGLE': 60,
+        'POWERUP_PADDLE_CHANCE': 10,
+        'POWERUP_BALL_CHANCE': 10,
+        'POWERUP_PADDLE_SIZE': 1.2,
+        'MAX_BALLS': 10,
+        'CHAOS': False,
+    },
+    'easy': {
+        'BALL_SPEED': 4,
+        'PADDLE_SPEED': 8,
+        'POWERUP_SPEED': 1,
+        'POWERUP_BIG_PADLLE_DURATION': 15,
+        'BALL_MULTIPLYER': 3,
+        'MAX_BOUNCE_ANGLE': 45,
+        'POWERUP_PADDLE_CHANCE': 25,
+        'POWERUP_BALL_CHANCE': 15,
+        'POWERUP_PADDLE_SIZE': 1.4,
+        'MAX_BALLS': 10,
+        'CHAOS': False,
+    },
+    'chaos': {
+        'BALL_SPEED': 5,
+        'PADDLE_SPEED': 8,
+        'POWERUP_SPEED': 2,
+        'POWERUP_BIG_PADLLE_DURATION': 10,
+        'BALL_MULTIPLYER': 4,
+        'MAX_BOUNCE_ANGLE': 60,
+        'POWERUP_PADDLE_CHANCE': 10,
+        'POWERUP_BALL_CHANCE': 10,
+        'POWERUP_PADDLE_SIZE': 1.2,
+        'MAX_BALLS': 300,
+        'CHAOS': True,
+    },
+}
+
+# difficulty sweeps, see sweep.py
+SWEEP_CACHE_DIR = 'sweeps'
+
+# reinforcement learning environments, see env.py
+ENV_OPPONENT = 'normal'     # AI_DIFFICULTIES of the other paddle, None for an idle one
+ENV_MAX_TICKS = 60 * 60 * 5  # a match is truncated after 5 minutes
+ENV_ACTION_REPEAT = 1       # ticks each action is held
@@ -0,0 +1,255 @@
+""" headless simulation core of a match.
+Own the paddles, the balls and the score without any display, mixer or font,
+so a match can be stepped as fast as the cpu allow (difficulty tuning, bots...)
+A match is deterministic : the same seed and the same actions every tick
+give the same match, see replay.py
+"""
+from collections.abc import Callable, Sequence
+from typing import Any
+import math
+import random
+import time
+from config import MatchConfig, Score
+from entitys import Paddle, Ball, no_sound
+from broadphase import SpatialGrid
+from prng import MatchRandom
+from inputs import Action
+from profiler import Profiler
+
+
+class Match:
+    """ two paddles, one or more balls and a score.
+    step() advance the match by one tick, nothing is rendered here.
+    Every physics value come from config, the current settings by default.
+    The first ball is the match ball, extra balls vanish when they score.
+    Every random draw come from the seed, a random one by default.
+    """
+    __slots__ = (
+        'config', 'score', 'ticks', 'paddle_hits', 'on_hit', 'seed', 'rng', 'paddles', 'balls',
+        'grid', 'profiler',
+    )
+
+    def __init__(
+        self,
+        score: Score | None = None,
+        on_hit: Callable[[], object] = no_sound,
+        seed: int | None = None,
+        config: MatchConfig | None = None,
+    ) -> None:
+        self.config = MatchConfig.from_settings() if config is None else config
+        config = self.config
+        self.score = Score() if score is None else score
+        self.ticks: int = 0
+        # balls sent back by a paddle, a statistic for the tools, not part of get_state()
+        self.paddle_hits: int = 0
+        self.on_hit = on_hit
+
+        self.seed: int = random.randrange(2 ** 32) if seed is None else seed
+        self.rng = MatchRandom(self.seed)
+
+        self.paddles: list[Paddle] = [
+            Paddle(
+                pos=(config.width / 10, config.height / 2),
+                player=0,
+                config=config,
+            ),
+            Paddle(
+                pos=(config.width * 0.9, config.height / 2),
+                player=1,
+                config=config,
+            ),
+        ]
+
+        self.balls: list[Ball] = [Ball(
+            pos=(config.width / 2, config.height / 2),
+            config=config,
+            score=self.score,
+            on_hit=on_hit,
+            rng=self.rng,
+        )]
+
+        # rebuilt every tick, only balls sharing a cell are tested together.
+        # created with the second ball, most matches never need it
+        self.grid: SpatialGrid[Ball] | None = None
+
+        # time the paddles and the balls updates, see profiler.py
+        self.profiler: Profiler | None = None
+
+    @property
+    def ball(self) -> Ball:
+        """ the match ball """
+        return self.balls[0]
+
+    def spawn_balls(self, pos: tuple[float, float], heading: float = 0.0) -> None:
+        """ add config.ball_multiplyer balls, up to config.max_balls.
+        They go right with a positive heading, left with a negative one, either way with 0
+        """
+        config = self.config
+        for _ in range(min(config.ball_multiplyer, config.max_balls - len(self.balls))):
+            angle = math.radians(
+                self.rng.uniform(-config.max_bounce_angle, config.max_bounce_angle)
+            )
+            self.balls.append(Ball(
+                pos=pos,
+                config=config,
+                score=self.score,
+                on_hit=self.on_hit,
+                direction=(
+                    math.copysign(math.cos(angle), heading) if heading
+                    else self.rng.choice([-1, 1]) * math.cos(angle),
+                    math.sin(angle),
+                ),
+            ))
+
+    def step(self, actions: Sequence[int], dt: float = 1.0) -> None:
+        """ move the paddles with their player held actions, then the balls.
+        dt is the length of the tick, 1 being one frame of the original game.
+        Action.SPAWN_BALLS from anyone spawn balls at the center (cheat).
+        """
+        if any(action & Action.SPAWN_BALLS for action in actions):
+            self.spawn_balls(pos=(self.config.width / 2, self.config.height / 2))
+
+        profiler = self.profiler if self.profiler is not None and self.profiler.enabled else None
+        if profiler is not None:
+            start = time.perf_counter_ns()
+
+        for paddle in self.paddles:
+            paddle.update(actions=actions[paddle.player], dt=dt)
+
+        if profiler is not None:
+            now = time.perf_counter_ns()
+            profiler.add('update.paddles', now - start)
+            start = now
+
+        # broadphase, on the area each ball will sweep during the tick.
+        # a lone ball is swept against both paddles
+        near_paddles: dict[Ball, list[Paddle]] = {}
+        grid = self.grid
+        if len(self.balls) == 1:
+            near_paddles[self.ball] = self.paddles
+        else:
+            if grid is None:
+                grid = self.grid = SpatialGrid(self.config.broadphase_cell_size)
+            grid.clear()
+            for ball in self.balls:
+                grid.insert(ball, ball.swept_frect(dt))
+            for paddle in self.paddles:
+                for ball in grid.query(paddle.frect):
+                    near_paddles.setdefault(ball, []).append(paddle)
+
+        # narrowphase, swept against the paddles.
+        # in chaos only the match ball multiply, and its new balls leave the paddle with it,
+        # spawned balls sent back in the paddle would hit it again and snowball
+        spawn_at: list[tuple[tuple[float, float], float]] = []
+        for ball in self.balls:
+            if ball.move(near_paddles.get(ball, []), dt):
+                self.paddle_hits += 1
+                if self.config.chaos and ball is self.ball:
+                    spawn_at.append((ball.frect.center, ball.direction.x))
+
+        if grid is not None and len(self.balls) > 1:
+            for ball, other in grid.pairs():
+                ball.collide_with_ball(other)
+
+        kept: list[Ball] = []
+        for ball in self.balls:
+            scored = ball.collide_with_walls()
+            ball.clamp_direction()
+            if not scored or ball is self.ball:
+                kept.append(ball)
+        self.balls = kept
+
+        for spawn in spawn_at:
+            self.spawn_balls(*spawn)
+
+        if profiler is not None:
+            profiler.add('update.balls', time.perf_counter_ns() - start)
+
+        self.ticks += 1
+
+    def get_state(self) -> dict[str, Any]:
+        """ copy of everything step() depend on, to restore it with set_state() """
+        return {
+            'ticks': self.ticks,
+            'score': self.score.as_dict(),
+            'rng': self.rng.getstate(),
+            'paddles': [
+                (paddle.frect.x, paddle.frect.y, paddle.previous, tuple(paddle.direction))
+                for paddle in self.paddles
+            ],
+            'balls': [
+                (ball.frect.x, ball.frect.y, ball.previous, tuple(ball.direction), ball.speed)
+                for ball in self.balls
+            ],
+        }
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """ go back (or forward) to a state from get_state().
+        The score is updated in place, it may be shared.
+        """
+        self.ticks = state['ticks']
+        self.score.update(state['score'])
+        self.rng.setstate(state['rng'])
+
+        for paddle, (x, y, previous, direction) in zip(self.paddles, state['paddles']):
+            paddle.frect.topleft = x, y
+            paddle.previous = previous
+            paddle.direction.update(direction)
+
+        balls = state['balls']
+        self.resize_balls(len(balls))
+        for ball, (x, y, previous, direction, speed) in zip(self.balls, balls):
+            ball.frect.topleft = x, y
+            ball.previous = previous
+            ball.direction.update(direction)
+            ball.speed = speed
+
+    def resize_balls(self, count: int) -> None:
+        """ keep the existing balls, only create the missing ones.
+        the new ones are placeholders, to set from a saved state
+        """
+        while len(self.balls) < count:
+            self.balls.append(Ball(
+                pos=(0, 0),
+                config=self.config,
+                score=self.score,
+                on_hit=self.on_hit,
+                direction=(1, 0),
+            ))
+        del self.balls[count:]
+
+    @property
+    def winner(self) -> str | None:
+        """ 'LEFT' or 'RIGHT' once a side reached config.win_score """
+        return self.score.winner(self.config.win_score)
+
+    def run(
+        self,
+        controllers: Sequence[Callable[['Match'], int]],
+        max_ticks: int,
+    ) -> str | None:
+        """ step until someone win or max_ticks is reached.
+        each controller return the actions its player hold for the next tick,
+        players without a controller don't move.
+        """
+        actions = [0] * len(self.paddles)
+        while self.winner is None and self.ticks < max_ticks:
+            for player, controller in enumerate(controllers):
+                actions[player] = controller(self)
+            self.step(actions)
+        return self.winner
+
+
+def follow_ball(paddle_index: int) -> Callable[[Match], int]:
+    """ scripted controller, move the paddle toward the ball height """
+
+    def controller(match: Match) -> int:
+        paddle = match.paddles[paddle_index]
+        offset = match.ball.frect.centery - paddle.frect.centery
+        if offset < -paddle.speed:
+            return Action.UP
+        if offset > paddle.speed:
+            return Action.DOWN
+        return 0
+
+    return controller
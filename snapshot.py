@@ -0,0 +1,335 @@
+""" compact binary snapshots of a match.
+A snapshot is the tick, the score, the state on top of the stack, the
+paddles and the balls, packed in a preallocated buffer with struct.pack_into
+(no intermediate bytes object). Two layouts :
+- exact : the FRect as float32 (what FRect store), the directions and the
+  speeds as float64, restore() give back the same entities
+- quantized : fixed point integers, about a third of the size, for the network
+
+A delta against a baseline snapshot is a bitmask of the bytes that changed
+(their XOR is not zero) followed by those XOR, in a few bytes since most of
+the snapshot don't change between two ticks.
+
+python snapshot.py : time the snapshots and the deltas
+"""
+from dataclasses import dataclass
+import struct
+import time
+from config import MatchConfig
+from simulation import Match, follow_ball
+
+MAGIC = b'FS'
+DELTA_MAGIC = b'FD'
+VERSION = 2
+
+QUANTIZED = 1  # flag
+
+# the states a snapshot can be taken in, by their State.__name__
+STATE_NAMES = (
+    'Loading',
+    'Mainmenu',
+    'Gameplay',
+    'NetplayGameplay',
+    'Pause',
+    'Gameover',
+    'Win',
+    'Settings',
+    'Difficulties',
+    'Resolution',
+)
+STATE_IDS = {name: index for index, name in enumerate(STATE_NAMES)}
+
+# magic, version, flags, tick, score left, score right, state id, number of balls
+HEADER = struct.Struct('<2sBBIHHBH')
+# frect x, y, width, height, direction x, direction y
+EXACT_PADDLE = struct.Struct('<4f2d')
+# frect x, y, width, height, direction x, direction y, speed
+EXACT_BALL = struct.Struct('<4f3d')
+# x, y in 1/POSITION_SCALE px, direction y
+QUANTIZED_PADDLE = struct.Struct('<hhb')
+# x, y in 1/POSITION_SCALE px, direction x, y in 1/DIRECTION_SCALE, speed in 1/SPEED_SCALE
+QUANTIZED_BALL = struct.Struct('<hhhhH')
+POSITION_SCALE = 8      # up to 4096 px
+DIRECTION_SCALE = 32767
+SPEED_SCALE = 256
+
+# magic, version, baseline size, snapshot size, then the mask and the changed bytes
+DELTA_HEADER = struct.Struct('<2sBHH')
+
+
+@dataclass
+class Decoded:
+    """ a snapshot read back, positions are the top left of the hitboxes """
+    tick: int
+    score: tuple[int, int]
+    state: str
+    # x, y, direction y
+    paddles: list[tuple[float, float, float]]
+    # x, y, direction x, direction y, speed
+    balls: list[tuple[float, float, float, float, float]]
+
+
+def snapshot_size(paddles: int, balls: int, quantized: bool) -> int:
+    """ bytes needed by a snapshot """
+    paddle, ball = (QUANTIZED_PADDLE, QUANTIZED_BALL) if quantized else (EXACT_PADDLE, EXACT_BALL)
+    return HEADER.size + paddles * paddle.size + balls * ball.size
+
+
+def delta_size(size: int) -> int:
+    """ bytes a delta of a snapshot of that size can take at most """
+    return DELTA_HEADER.size + (size + 7) // 8 + size
+
+
+class Snapshot:
+    """ a reusable buffer holding the last snapshot taken.
+    capture() overwrite it, copy view (bytes(view)) to keep a snapshot.
+    The buffer fit config.max_balls balls, capture() raise ValueError past that.
+    """
+
+    def __init__(
+        self,
+        quantized: bool = False,
+        config: MatchConfig | None = None,
+        paddles: int = 2,
+    ) -> None:
+        config = MatchConfig.from_settings() if config is None else config
+        self.quantized = quantized
+        # room for every ball the matches of that config can have
+        self.buffer = bytearray(snapshot_size(paddles, config.max_balls, quantized))
+        self.size = 0
+
+    @property
+    def view(self) -> memoryview:
+        """ the bytes of the last snapshot, valid until the next capture """
+        return memoryview(self.buffer)[:self.size]
+
+    def capture(self, match: Match, state: str = 'Gameplay') -> memoryview:
+        """ write the match in the buffer """
+        self.size = write(match, self.buffer, quantized=self.quantized, state=state)
+        return self.view
+
+
+def write(match: Match, buffer: bytearray, quantized: bool = False, state: str = 'Gameplay') -> int:
+    """ pack the match at the start of buffer, return the size used """
+    balls = match.balls
+    if len(buffer) < snapshot_size(len(match.paddles), len(balls), quantized):
+        raise ValueError(f'buffer too small for a snapshot of {len(balls)} balls')
+    HEADER.pack_into(
+        buffer, 0,
+        MAGIC, VERSION, QUANTIZED if quantized else 0,
+        match.ticks, match.score.left, match.score.right, STATE_IDS[state], len(balls),
+    )
+    offset = HEADER.size
+
+    if quantized:
+        pack_paddle, paddle_size = QUANTIZED_PADDLE.pack_into, QUANTIZED_PADDLE.size
+        for paddle in match.paddles:
+            frect = paddle.frect
+            pack_paddle(
+                buffer, offset,
+                round(frect.x * POSITION_SCALE), round(frect.y * POSITION_SCALE),
+                int(paddle.direction.y),
+            )
+            offset += paddle_size
+        pack_ball, ball_size = QUANTIZED_BALL.pack_into, QUANTIZED_BALL.size
+        for ball in balls:
+            frect, direction = ball.frect, ball.direction
+            pack_ball(
+                buffer, offset,
+                round(frect.x * POSITION_SCALE), round(frect.y * POSITION_SCALE),
+                round(direction.x * DIRECTION_SCALE), round(direction.y * DIRECTION_SCALE),
+                round(ball.speed * SPEED_SCALE),
+            )
+            offset += ball_size
+        return offset
+
+    pack_paddle, paddle_size = EXACT_PADDLE.pack_into, EXACT_PADDLE.size
+    for paddle in match.paddles:
+        pack_paddle(buffer, offset, *paddle.frect, *paddle.direction)
+        offset += paddle_size
+    pack_ball, ball_size = EXACT_BALL.pack_into, EXACT_BALL.size
+    for ball in balls:
+        pack_ball(buffer, offset, *ball.frect, *ball.direction, ball.speed)
+        offset += ball_size
+    return offset
+
+
+def _header(data: bytes | bytearray | memoryview) -> tuple[int, int, int, int, int, int]:
+    """ flags, tick, score left, score right, state id, balls.
+    raise ValueError if not a snapshot
+    """
+    magic, version, flags, tick, left, right, state, balls = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'not a version {VERSION} snapshot')
+    return flags, tick, left, right, state, balls
+
+
+def read(data: bytes | bytearray | memoryview, paddles: int = 2) -> Decoded:
+    """ decode a snapshot of either layout """
+    flags, tick, left, right, state, balls = _header(data)
+    offset = HEADER.size
+    decoded = Decoded(
+        tick=tick, score=(left, right), state=STATE_NAMES[state], paddles=[], balls=[],
+    )
+
+    if flags & QUANTIZED:
+        for x, y, direction_y in QUANTIZED_PADDLE.iter_unpack(
+            data[offset:offset + paddles * QUANTIZED_PADDLE.size]
+        ):
+            decoded.paddles.append((x / POSITION_SCALE, y / POSITION_SCALE, float(direction_y)))
+        offset += paddles * QUANTIZED_PADDLE.size
+        for x, y, direction_x, direction_y, speed in QUANTIZED_BALL.iter_unpack(
+            data[offset:offset + balls * QUANTIZED_BALL.size]
+        ):
+            decoded.balls.append((
+                x / POSITION_SCALE, y / POSITION_SCALE,
+                direction_x / DIRECTION_SCALE, direction_y / DIRECTION_SCALE,
+                speed / SPEED_SCALE,
+            ))
+        return decoded
+
+    for x, y, _, _, _, direction_y in EXACT_PADDLE.iter_unpack(
+        data[offset:offset + paddles * EXACT_PADDLE.size]
+    ):
+        decoded.paddles.append((x, y, direction_y))
+    offset += paddles * EXACT_PADDLE.size
+    for x, y, _, _, direction_x, direction_y, speed in EXACT_BALL.iter_unpack(
+        data[offset:offset + balls * EXACT_BALL.size]
+    ):
+        decoded.balls.append((x, y, direction_x, direction_y, speed))
+    return decoded
+
+
+def restore(data: bytes | bytearray | memoryview, match: Match) -> None:
+    """ put the match back in an exact snapshot.
+    The balls missing are created, the extra ones removed.
+    """
+    flags, tick, left, right, _, balls = _header(data)
+    if flags & QUANTIZED:
+        raise ValueError('a quantized snapshot can not be restored')
+    match.ticks = tick
+    match.score.left, match.score.right = left, right
+
+    offset = HEADER.size
+    for paddle in match.paddles:
+        x, y, width, height, direction_x, direction_y = EXACT_PADDLE.unpack_from(data, offset)
+        paddle.frect.update(x, y, width, height)
+        paddle.previous = paddle.frect.topleft
+        paddle.direction.update(direction_x, direction_y)
+        offset += EXACT_PADDLE.size
+
+    match.resize_balls(balls)
+    for ball in match.balls:
+        x, y, width, height, direction_x, direction_y, speed = EXACT_BALL.unpack_from(data, offset)
+        ball.frect.update(x, y, width, height)
+        ball.previous = ball.frect.topleft
+        ball.direction.update(direction_x, direction_y)
+        ball.speed = speed
+        offset += EXACT_BALL.size
+
+
+# translate a xor to b'0' (unchanged) and b'1' (changed) per byte
+_CHANGED = bytes([ord('0')] + [ord('1')] * 255)
+
+
+class DeltaEncoder:
+    """ encode and decode deltas with reused scratch buffers.
+    encode() and decode() return views on those buffers, valid until the next call.
+    The buffers fit the snapshots of the matches of config.
+    """
+
+    def __init__(self, config: MatchConfig | None = None, quantized: bool = False) -> None:
+        config = MatchConfig.from_settings() if config is None else config
+        size = snapshot_size(2, config.max_balls, quantized)
+        self.padded = bytearray(size)
+        self.encoded = bytearray(delta_size(size))
+        self.decoded = bytearray(size)
+
+    def _pad(self, baseline: bytes | bytearray | memoryview, size: int) -> memoryview:
+        """ the baseline cut or zero padded to size """
+        common = min(size, len(baseline))
+        self.padded[:common] = baseline[:common]
+        self.padded[common:size] = bytes(size - common)
+        return memoryview(self.padded)[:size]
+
+    def encode(
+        self,
+        snapshot: bytes | bytearray | memoryview,
+        baseline: bytes | bytearray | memoryview,
+    ) -> memoryview:
+        """ the delta turning baseline into snapshot """
+        size = len(snapshot)
+        xored = (
+            int.from_bytes(snapshot, 'little') ^ int.from_bytes(self._pad(baseline, size), 'little')
+        ).to_bytes(size, 'little')
+        mask_size = (size + 7) // 8
+        # bit i of the mask is set when the byte i changed
+        mask = int(xored.translate(_CHANGED)[::-1], 2) if size else 0
+        changed = xored.replace(b'\0', b'')
+
+        DELTA_HEADER.pack_into(self.encoded, 0, DELTA_MAGIC, VERSION, len(baseline), size)
+        offset = DELTA_HEADER.size
+        self.encoded[offset:offset + mask_size] = mask.to_bytes(mask_size, 'little')
+        offset += mask_size
+        self.encoded[offset:offset + len(changed)] = changed
+        return memoryview(self.encoded)[:offset + len(changed)]
+
+    def decode(
+        self,
+        delta: bytes | bytearray | memoryview,
+        baseline: bytes | bytearray | memoryview,
+    ) -> memoryview:
+        """ the snapshot from a delta and its baseline. raise ValueError on a wrong baseline """
+        magic, version, baseline_size, size = DELTA_HEADER.unpack_from(delta)
+        if magic != DELTA_MAGIC or version != VERSION:
+            raise ValueError(f'not a version {VERSION} delta')
+        if baseline_size != len(baseline):
+            raise ValueError('delta from another baseline')
+        mask_size = (size + 7) // 8
+        offset = DELTA_HEADER.size
+        mask = int.from_bytes(delta[offset:offset + mask_size], 'little')
+        changed = delta[offset + mask_size:]
+
+        decoded = self.decoded
+        decoded[:size] = self._pad(baseline, size)
+        bits = format(mask, f'0{size}b')[::-1] if size else ''
+        positions = [index for index, bit in enumerate(bits) if bit == '1']
+        if len(positions) != len(changed):
+            raise ValueError('corrupted delta')
+        for index, byte in zip(positions, changed):
+            decoded[index] ^= byte
+        return memoryview(decoded)[:size]
+
+
+def main() -> None:
+    """ time the snapshots and the deltas on a match in play """
+    match = Match(seed=0)
+    controllers = [follow_ball(0), follow_ball(1)]
+    encoder = DeltaEncoder(match.config)
+    count = 10000
+
+    for quantized in (False, True):
+        snapshot = Snapshot(quantized=quantized, config=match.config)
+        baseline = bytes(snapshot.capture(match))
+        capture_time = delta_time = 0.0
+        delta_bytes = 0
+        for _ in range(count):
+            match.step([controller(match) for controller in controllers])
+            start = time.perf_counter()
+            view = snapshot.capture(match)
+            middle = time.perf_counter()
+            delta = encoder.encode(view, baseline)
+            delta_time += time.perf_counter() - middle
+            capture_time += middle - start
+            delta_bytes += len(delta)
+            baseline = bytes(view)
+
+        name = 'quantized' if quantized else 'exact'
+        print(
+            f'{name}: {snapshot.size} bytes, capture {capture_time / count * 1e6:.1f} us, '
+            f'delta {delta_time / count * 1e6:.1f} us, {delta_bytes / count:.1f} bytes'
+        )
+
+
+if __name__ == '__main__':
+    main()
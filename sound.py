@@ -1,7 +1,131 @@
-""" global container of sound objects """
-
+""" global sound service.
+Nothing is initialized at import : the mixer is started on the first use,
+or replaced by a silent backend for headless runs and machines without audio.
+Effects play on a fixed pool of channels and each effect is rate limited,
+so a burst of bounces doesn't stall the mixer.
+"""
+from typing import Generic, Protocol, TypeVar
+import time
 import pygame
+import settings
+
+T = TypeVar('T')
+
+
+# decoded at startup by the assets.Loader
+FILES: dict[str, str] = {
+    'ball_hit': 'assets/Sounds/hit2.wav',
+}
+
+
+class Backend(Protocol[T]):
+    """ decode and play effects of type T """
+
+    def load(self, path: str) -> T:
+        """ decode a sound file, can run on a worker thread """
+
+    def play(self, effect: T) -> None:
+        """ play an effect decoded by load() """
+
+
+class NullBackend:
+    """ play nothing, for headless runs """
+
+    def load(self, path: str) -> str:
+        """ nothing to decode, keep the path """
+        return path
+
+    def play(self, effect: str) -> None:
+        """ silence """
+
+
+class MixerBackend:
+    """ pygame mixer with a fixed pool of channels """
+
+    def __init__(self, channels: int) -> None:
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(channels)
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.next_channel = 0
+
+    def load(self, path: str) -> pygame.mixer.Sound:
+        """ decode a sound file, can run on a worker thread """
+        return pygame.mixer.Sound(path)
+
+    def play(self, effect: pygame.mixer.Sound) -> None:
+        """ play on the next free channel, or cut the oldest one """
+        count = len(self.channels)
+        for offset in range(count):
+            channel = self.channels[(self.next_channel + offset) % count]
+            if not channel.get_busy():
+                break
+        else:
+            channel = self.channels[self.next_channel]
+        self.next_channel = (self.channels.index(channel) + 1) % count
+        channel.play(effect)
+
+
+class Effects(Generic[T]):
+    """ a backend and the effects it decoded, by name """
+
+    def __init__(self, backend: Backend[T]) -> None:
+        self.backend = backend
+        self.decoded: dict[str, T] = {}
+
+    def load(self, path: str) -> T:
+        """ decode a sound file, can run on a worker thread """
+        return self.backend.load(path)
+
+    def store(self, name: str, effect: T) -> None:
+        """ keep an effect decoded by load() (see assets.Loader) """
+        self.decoded[name] = effect
+
+    def play(self, name: str) -> None:
+        """ play an effect, decoded on its first use if it wasn't preloaded """
+        if name not in self.decoded:
+            self.decoded[name] = self.backend.load(FILES[name])
+        self.backend.play(self.decoded[name])
+
+
+class SoundService:
+    """ lazily started backend, decoded effects and rate limiting """
+
+    def __init__(self) -> None:
+        self.effects: Effects[str] | Effects[pygame.mixer.Sound] | None = None
+        self.last_played: dict[str, float] = {}
+
+    def start(self) -> Effects[str] | Effects[pygame.mixer.Sound]:
+        """ start the backend if it isn't, the mixer unless settings.SOUND is off """
+        if self.effects is None:
+            if not settings.SOUND:
+                self.effects = Effects(NullBackend())
+            else:
+                try:
+                    self.effects = Effects(MixerBackend(settings.SOUND_CHANNELS))
+                except pygame.error:
+                    # no audio device
+                    self.effects = Effects(NullBackend())
+        return self.effects
+
+    def play(self, name: str) -> None:
+        """ play an effect, unless it already played too recently """
+        now = time.monotonic()
+        last = self.last_played.get(name)
+        if last is not None and now - last < settings.SOUND_MIN_INTERVAL:
+            return
+        self.last_played[name] = now
+
+        self.start().play(name)
+
+
+service = SoundService()
+
+
+def play(name: str) -> None:
+    """ play an effect by name, see FILES """
+    service.play(name)
 
-pygame.mixer.init()
 
-ball_hit = pygame.mixer.Sound("assets/Sounds/hit2.wav")
+def play_ball_hit() -> None:
+    """ bounce sound, used as the balls on_hit callback """
+    service.play('ball_hit')
@@ -1,9 +1,18 @@
 """ define game states and menus """
 from collections.abc import Callable
 from abc import ABC, abstractmethod
+import os
+import time
 import pygame
-from entitys import Paddle, Ball
+from simulation import Match
+from config import MatchConfig, Score
 import settings
+import sound
+import assets
+from inputs import Inputs, Action, MOVES
+from replay import Recorder, prune
+from ai import PaddleAI
+from netcode import RollbackSession
 
 
 class State(ABC):
@@ -13,8 +22,15 @@ class State(ABC):
         self.game = game
         self.prev_state: State
 
+        # areas of the screen changed by the last render, None for the whole screen
+        self.dirty_rects: list[pygame.Rect] | None = None
+        # set by the game when the state come back on top of the stack
+        self.full_redraw: bool = True
+        # a static state only change on inputs, the game sleep while it's on top
+        self.is_static: bool = False
+
     @abstractmethod
-    def update(self, keys: set[str]) -> None:
+    def update(self, inputs: Inputs) -> None:
         """ abstract state method
         each state must have an update method """
 
@@ -23,6 +39,10 @@ class State(ABC):
         """ abstract state method
         each state must have a render method """
 
+    def debug_lines(self) -> list[str]:
+        """ shown on the profiler overlay, nothing by default """
+        return []
+
     def enter_state(self) -> None:
         """ append itself to the stack """
         if len(self.game.stack) > 1:
@@ -39,6 +59,49 @@ class State(ABC):
             pass
 
 
+class Loading(State):
+    """ first state of the stack.
+    Show the splash art and a progress bar while assets.Loader decode
+    the assets in the background, then replace itself by the main menu.
+    """
+
+    def __init__(self, game) -> None:
+        super().__init__(game)
+
+        self.__name__: str = 'Loading'
+
+        # the only image loaded synchronously
+        self.splash: pygame.Surface = pygame.image.load(file=settings.SPLASH_IMAGE).convert()
+
+        self.loader = assets.Loader()
+
+        self.enter_state()
+
+    def update(self, inputs: Inputs) -> None:
+        """ store what the worker decoded, leave once everything is loaded """
+        if self.loader.poll():
+            Mainmenu(self.game)
+            # online, straight to the match
+            if self.game.session is not None:
+                NetplayGameplay(self.game, self.game.session)
+            # the stack shall never be empty, remove ourself from under the menu
+            self.game.stack.remove(self)
+
+    def render(self, canvas: pygame.Surface) -> None:
+        """ splash art and progress bar """
+        canvas.fill(settings.BACKGROUND_COLOR)
+        canvas.blit(
+            source=self.splash,
+            dest=self.splash.get_frect(center=(settings.WIDTH / 2, settings.HEIGHT / 2)),
+        )
+
+        progress_bar = pygame.FRect(0, 0, settings.WIDTH * 0.6, settings.HEIGHT / 32)
+        progress_bar.midbottom = settings.WIDTH / 2, settings.HEIGHT * 0.95
+        pygame.draw.rect(canvas, settings.LOADING_BAR_COLOR, progress_bar, width=1)
+        progress_bar.width *= self.loader.progress
+        pygame.draw.rect(canvas, settings.LOADING_BAR_COLOR, progress_bar)
+
+
 class Menu(State, ABC):
     """ Parent class of all menus, handel buttons and labels rendering.
     The first button declared is the bottom one.
@@ -64,7 +127,8 @@ class Menu(State, ABC):
             """ recreate an image and a frect
             arg new_text is a string, will be rendered using self.font
             """
-            self.image: pygame.Surface = self.font.render(new_text, False, settings.FONT_COLOR)
+            glyphs = assets.glyphs(self.font, settings.FONT_COLOR)
+            self.image: pygame.Surface = glyphs.render(new_text)
             self.frect: pygame.FRect = self.image.get_frect()
             self.frect.center = pos
 
@@ -88,16 +152,17 @@ class Menu(State, ABC):
             self.font = font
             self.selected = selected
 
-            self.image: pygame.Surface = self.font.render(self.text, False, color=(0, 0, 0))
+            # both looks are rendered once, selecting only swap them
+            self.images: dict[bool, pygame.Surface] = {
+                False: assets.glyphs(self.font, (0, 0, 0)).render(self.text),
+                True: assets.glyphs(self.font, (50, 50, 50)).render('>' + self.text + '<'),
+            }
+            self.image: pygame.Surface = self.images[False]
             self.frect: pygame.FRect = self.image.get_frect()
 
         def update(self) -> None:
             """ add ">button<" arround the button if selected """
-            if self.selected:
-                self.image = self.font.render(('>' + self.text + '<'), False, color=(50, 50, 50))
-            else:
-                self.image = self.font.render(self.text, False, color=(0, 0, 0))
-
+            self.image = self.images[self.selected]
             self.frect = self.image.get_frect()
 
         def render(self, canvas: pygame.Surface, dest: tuple[float, float]) -> None:
@@ -117,35 +182,38 @@ class Menu(State, ABC):
         # background
         self.background_color = background_color
         self.is_transparent = is_transparent
+        # menus only change when a key is pressed
+        self.is_static = True
+
+        # transparent menus freeze the state under them :
+        # its last frame and the tint are composed once in this surface
+        self.overlay: pygame.Surface | None = None
 
         # font
-        self.font = pygame.font.Font('font/PixeloidSans.ttf', 30)
-        self.bold_font = pygame.font.Font('font/PixeloidSansBold.ttf', 35)
-        self.big_font = pygame.font.Font('font/PixeloidSansBold.ttf', 80)
+        self.font = assets.font(settings.FONT_NAME, settings.FONT_SIZE)
+        self.bold_font = assets.font(settings.BOLD_FONT_NAME, settings.BOLD_FONT_SIZE)
+        self.big_font = assets.font(settings.BOLD_FONT_NAME, settings.BIG_FONT_SIZE)
 
         # create buttons and labels list for each child
         self.buttons: list[Menu.Button] = []
         self.labels: list[Menu.Label] = []
 
-    def update(self, keys: set[str]) -> None:
+    def update(self, inputs: Inputs) -> None:
         """ move the selected/focus across buttons
         and apply action if a button is pressed """
 
         # exit the menu if ESC is pressed
-        if 'ESCAPE' in keys:
-            keys.remove('ESCAPE')
+        if inputs.take(Action.BACK):
             self.exit_state()
 
         for i, button in enumerate(self.buttons):
-            if 'UP' in keys and button.selected and i != len(self.buttons) - 1:
-                keys.remove('UP')
+            if button.selected and i != len(self.buttons) - 1 and inputs.take(Action.UP):
                 self.buttons[i + 1].selected = True
                 button.selected = False
                 self.buttons[i + 1].update()
                 button.update()
                 break
-            if 'DOWN' in keys and button.selected and i != 0:
-                keys.remove('DOWN')
+            if button.selected and i != 0 and inputs.take(Action.DOWN):
                 self.buttons[i - 1].selected = True
                 self.buttons[i - 1].update()
                 button.selected = False
@@ -153,8 +221,7 @@ class Menu(State, ABC):
                 break
 
             # button action
-            if 'RETURN' in keys and button.selected:
-                keys.remove('RETURN')
+            if button.selected and inputs.take(Action.CONFIRM):
                 button.function()
                 # break
 
@@ -162,13 +229,18 @@ class Menu(State, ABC):
         """ blit buttons, labels and a background to the given surface """
         # background
         if self.is_transparent:
-            self.prev_state.render(canvas=canvas)
-            # not optimized but avoid needing to reload the stack every resolution change
-            transparent_background = pygame.Surface(size=(settings.WIDTH, settings.HEIGHT))
-            transparent_background.fill(self.background_color)
-            transparent_background.set_alpha(settings.TRANSPARENCY_ALPHA)
-
-            canvas.blit(source=transparent_background, dest=(0, 0))
+            # rebuilt only the first time and when the resolution change
+            if self.overlay is None or self.overlay.get_size() != (settings.WIDTH, settings.HEIGHT):
+                self.overlay = pygame.Surface(size=(settings.WIDTH, settings.HEIGHT))
+                self.prev_state.render(canvas=self.overlay)
+
+                transparent_background = pygame.Surface(size=(settings.WIDTH, settings.HEIGHT))
+                transparent_background.fill(self.background_color)
+                transparent_background.set_alpha(settings.TRANSPARENCY_ALPHA)
+                self.overlay.blit(source=transparent_background, dest=(0, 0))
+                self.overlay = self.overlay.convert()
+
+            canvas.blit(source=self.overlay, dest=(0, 0))
         else:
             canvas.fill(self.background_color)
 
@@ -191,129 +263,197 @@ class Gameplay(State):
     """ main part of the game.
     is a state on the stack
     """
-    def __init__(self, game) -> None:
+    # the match only run here, it can be paused and won with the cheat
+    local = True
+
+    def __init__(self, game, seed: int | None = None, config: MatchConfig | None = None) -> None:
         super().__init__(game)
 
         self.__name__: str = 'Gameplay'
 
-        self.field: pygame.Surface = pygame.transform.scale(
-            surface=pygame.image.load(
-                file='assets/Field/field3.png'
-            ).convert(),
-            size=(settings.WIDTH, settings.HEIGHT)
+        self.field: pygame.Surface = assets.image(
+            settings.FIELD_IMAGE,
+            size=(settings.WIDTH, settings.HEIGHT),
         )
 
+        # what never move, restored under the entities every frame
+        self.background = self.field.copy()
+        if settings.SHOW_HITBOX:
+            pygame.draw.line(
+                surface=self.background,
+                color='#ff0000',
+                start_pos=(settings.WIDTH / 2, 0),
+                end_pos=(settings.WIDTH / 2, settings.HEIGHT)
+            )
+        # areas drawn on by the last frame
+        self.drawn: list[pygame.Rect] = []
 
-        # reset score
-        settings.score['RIGHT'] = 0
-        settings.score['LEFT'] = 0
-        self.last_score = settings.score.copy()
-
-        self.score_font = pygame.font.Font('font/PixeloidSansBold.ttf', 50)
-        self.score_left_image: pygame.Surface = self.score_font.render(
-            text=str(settings.score['LEFT']),
-            antialias=False,
-            color=settings.SCORE_COLOR
-        )
-        self.score_right_image: pygame.Surface = self.score_font.render(
-            text=str(settings.score['RIGHT']),
-            antialias=False,
-            color=settings.SCORE_COLOR
+        # the score is drawn glyph by glyph every frame, no font.render on goals
+        self.score_glyphs = assets.glyphs(
+            assets.font(settings.BOLD_FONT_NAME, settings.SCORE_FONT_SIZE),
+            settings.SCORE_COLOR,
         )
 
         # add itself to the stack
         self.enter_state()
 
-        # create objects
-        self.paddles: list[Paddle] = []
-        self.paddles.append(Paddle(
-            pos=(settings.WIDTH / 10, settings.HEIGHT / 2),
-            keybinds=settings.P1Keys,
-        ))
-        self.paddles.append(Paddle(
-            pos=(settings.WIDTH * 0.9, settings.HEIGHT / 2),
-            keybinds=settings.P2Keys,
-        ))
-
-        self.ball = Ball(pos=(settings.WIDTH/2, settings.HEIGHT/2))
+        # create objects, the physics live in a headless match
+        # with the difficulty and the field size chosen in the menus
+        self.match = Match(
+            on_hit=self.play_hit,
+            seed=seed,
+            config=game.config if config is None else config,
+        )
+        self.last_score = self.match.score.as_dict()
+        # computer players, as good as the difficulty
+        self.ais = [PaddleAI(player, game.difficulty) for player in game.ai_players]
+        self.match.profiler = game.profiler
+        # every tick is recorded, the replay is saved when someone win
+        self.recorder = Recorder(self.match, dt=settings.REFERENCE_HZ / settings.SIM_HZ)
+        self.replay_path = os.path.join(
+            settings.REPLAY_DIR,
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{self.match.seed}.replay',
+        )
 
-    def update(self, keys: set[str]) -> None:
+    def update(self, inputs: Inputs) -> None:
         """ update the balls, powerups and paddle """
-        # update the paddles
-        for paddle in self.paddles:
-            paddle.update(keys=keys)
-
-
-        self.ball.update(self.paddles)
-
-        # only update score images if the score change
-        # also check if someone won
-        if self.last_score != settings.score:
-            self.score_left_image = self.score_font.render(
-                text=str(settings.score['LEFT']),
-                antialias=False,
-                color=settings.SCORE_COLOR
-            )
-            self.score_right_image = self.score_font.render(
-                text=str(settings.score['RIGHT']),
-                antialias=False,
-                color=settings.SCORE_COLOR
-            )
-            self.last_score = settings.score.copy()
-
-            # check win
-            for score in settings.score.values():
-                if score >= settings.WIN_SCORE:
-                    Win(self.game)
-
-        # process keys press
-        if 'ESCAPE' in keys:
-            keys.remove('ESCAPE')  # prevent the pause to immediately quit
-            Pause(self.game)
-        if 'p' in keys and settings.CHEATS:
-            keys.remove('p')
-            Win(self.game)
+        actions = [held & MOVES for held in inputs.held]
+        for ai in self.ais:
+            actions[ai.player] = ai(self.match)
+        if settings.CHEATS and inputs.take(Action.SPAWN_BALLS):
+            actions[0] |= Action.SPAWN_BALLS
+        self.step_match(actions)
+
+        # check if someone won when the score change
+        score = self.final_score()
+        if self.last_score != score.as_dict():
+            self.last_score = score.as_dict()
+            if score.winner(self.match.config.win_score) is not None:
+                self.save_replay()
+                Win(self.game, score)
+
+        # process keys press, taken so the pause doesn't immediately quit
+        if self.local and inputs.take(Action.BACK):
+            Pause(self.game, score)
+        if self.local and settings.CHEATS and inputs.take(Action.CHEAT_WIN):
+            Win(self.game, score)
+
+    def final_score(self) -> Score:
+        """ the score no later tick can change """
+        return self.match.score
+
+    def step_match(self, actions: list[int]) -> None:
+        """ play one tick of the match with the actions of every player """
+        self.recorder.step(actions)
+
+    def play_hit(self) -> None:
+        """ bounce sound, the balls on_hit callback """
+        sound.play_ball_hit()
+
+    def save_replay(self) -> None:
+        """ write the replay of the finished match, see replay.py """
+        if not settings.RECORD_REPLAYS:
+            return
+        os.makedirs(settings.REPLAY_DIR, exist_ok=True)
+        self.recorder.save(self.replay_path)
+        prune(settings.REPLAY_DIR, settings.REPLAY_KEEP)
 
     def render(self, canvas: pygame.Surface) -> None:
-        """ blit paddles to the given surface """
-
-        canvas.blit(source=self.field, dest=(0,0))
+        """ blit paddles to the given surface.
+        On top of the stack only what moved is redrawn : the background is
+        restored under the last frame drawings, then everything is drawn
+        again and both areas are left in self.dirty_rects.
+        """
+        on_top = self.game.stack[-1] is self
+        if self.full_redraw or not on_top:
+            canvas.blit(source=self.background, dest=(0, 0))
+            self.dirty_rects = None
+            self.full_redraw = not on_top
+        else:
+            for rect in self.drawn:
+                canvas.blit(source=self.background, dest=rect, area=rect)
+            self.dirty_rects = self.drawn
 
-        if settings.SHOW_HITBOX:
-            pygame.draw.line(
-            surface=canvas,
-            color='#ff0000',
-            start_pos=(settings.WIDTH / 2, 0),
-            end_pos=(settings.WIDTH / 2, settings.HEIGHT)
-        )
+        # interpolate between the last two ticks, unless frozen under another state
+        alpha = self.game.alpha if on_top else 1.0
 
-        self.ball.render(canvas=canvas)
+        drawn: list[pygame.Rect] = []
+        with self.game.profiler.measure('render.balls'):
+            for ball in self.match.balls:
+                drawn.append(ball.render(canvas=canvas, alpha=alpha))
 
         # render the paddles
-        for paddle in self.paddles:
-            paddle.render(canvas=canvas)
+        with self.game.profiler.measure('render.paddles'):
+            for paddle in self.match.paddles:
+                drawn.append(paddle.render(canvas=canvas, alpha=alpha))
 
         # blit score label
-        canvas.blit(
-            source=self.score_left_image,
-            dest=(
-                (settings.WIDTH / 4) - (self.score_left_image.width/2),
-                self.score_left_image.height
-            )
-        )
-        canvas.blit(
-            source=self.score_right_image,
-            dest=(
-                (settings.WIDTH / 4) * 3 - (self.score_right_image.width/2),
-                self.score_right_image.height
-            )
-        )
+        for text, centerx in (
+            (str(self.match.score.left), settings.WIDTH / 4),
+            (str(self.match.score.right), settings.WIDTH / 4 * 3),
+        ):
+            width, height = self.score_glyphs.size(text)
+            drawn.append(self.score_glyphs.blit(canvas, text, (centerx - width / 2, height)))
+
+        if self.dirty_rects is not None:
+            self.dirty_rects = self.dirty_rects + drawn
+        self.drawn = drawn
+
+    def debug_lines(self) -> list[str]:
+        """ the score, positions of the match ball and the paddles """
+        ball = self.match.ball.frect
+        lines = [
+            f'score {self.match.score}',
+            f'{len(self.match.balls)} balls, ball at {ball.x:.1f}, {ball.y:.1f}',
+        ]
+        for paddle in self.match.paddles:
+            lines.append(f'paddle {paddle.player} at {paddle.frect.x:.1f}, {paddle.frect.y:.1f}')
+        return lines
 
     def __repr__(self) -> str:
         """ return the type of the state """
         return 'Gameplay'
 
 
+class NetplayGameplay(Gameplay):
+    """ online match, see netcode.py.
+    Both players use their own keys (or any player keys), the other one is
+    played on the remote machine.
+    The goals count once the remote actions of their tick arrived, the pause
+    and the win cheat are off : the remote peer can't wait or follow.
+    """
+    local = False
+
+    def __init__(self, game, session: RollbackSession) -> None:
+        self.session = session
+        # the rules of the host, whatever the menus of this game say
+        super().__init__(game, seed=session.seed, config=session.config)
+        self.__name__ = 'NetplayGameplay'
+        session.start(self.match, dt=settings.REFERENCE_HZ / settings.SIM_HZ)
+
+    def step_match(self, actions: list[int]) -> None:
+        """ the local actions go through the rollback session """
+        local = 0
+        for action in actions:
+            local |= action
+        self.session.advance(local)
+
+    def final_score(self) -> Score:
+        """ a goal of a mispredicted tick can still be rolled back """
+        return self.session.confirmed_score
+
+    def play_hit(self) -> None:
+        """ the rolled back ticks already played their sounds """
+        if not self.session.resimulating:
+            super().play_hit()
+
+    def save_replay(self) -> None:
+        """ the ticks are played many times and in any order, nothing to record """
+
+    def __repr__(self) -> str:
+        return 'NetplayGameplay'
+
+
 class Mainmenu(Menu):
     """ this is the first state in the stack """
 
@@ -380,7 +520,7 @@ class Gameover(Menu):
     shows score
     """
 
-    def __init__(self, game) -> None:
+    def __init__(self, game, score: Score) -> None:
         super().__init__(game, settings.GAMEOVER_BACKGROUND_COLOR)
         # append itself to the stack
         self.enter_state()
@@ -408,7 +548,7 @@ class Gameover(Menu):
             pos=(settings.WIDTH // 2, settings.HEIGHT // 10)
         ))  # GAME OVER
         self.labels.append(Menu.Label(
-            text=f'score : {settings.score['RIGHT']}-{settings.score['LEFT']}',
+            text=f'score : {score.right}-{score.left}',
             font=self.bold_font,
             pos=(settings.WIDTH // 2, (settings.HEIGHT // 16) * 11)
         ))  # score : 99
@@ -432,7 +572,7 @@ class Win(Menu):
     show score
     """
 
-    def __init__(self, game) -> None:
+    def __init__(self, game, score: Score) -> None:
         super().__init__(game, settings.WIN_BACKGROUND_COLOR)
         # append itself to the stack
         self.enter_state()
@@ -461,7 +601,7 @@ class Win(Menu):
                 pos=(settings.WIDTH // 2, settings.HEIGHT // 10),
             ),  # YOU WON
             Menu.Label(
-                text=f'score : {settings.score['LEFT']}-{settings.score['RIGHT']}',
+                text=f'score : {score.left}-{score.right}',
                 font=self.bold_font,
                 pos=(settings.WIDTH // 2, (settings.HEIGHT // 16) * 11),
             ),  # score : 090
@@ -483,7 +623,7 @@ class Pause(Menu):
     background transparent, so you can see the last frame of the last state
     """
 
-    def __init__(self, game) -> None:
+    def __init__(self, game, score: Score) -> None:
         super().__init__(game, settings.PAUSE_BACKGROUND_COLOR, is_transparent=True)
 
         # append itself to the stack
@@ -513,7 +653,7 @@ class Pause(Menu):
             pos=(settings.WIDTH // 2, settings.HEIGHT // 10)
         ))  # settings
         self.labels.append(Menu.Label(
-            text=f'score : {settings.score['LEFT']}-{settings.score['RIGHT']}',
+            text=f'score : {score.left}-{score.right}',
             font=self.bold_font,
             pos=(settings.WIDTH // 2, int(settings.HEIGHT * 0.8))
         ))  # score : 999
@@ -577,7 +717,7 @@ class Settings(Menu):
 
 class Difficulties(Menu):
     """ select a difficulties.
-    Change values in settings
+    Change the config of the next matches
     """
 
     def __init__(self, game) -> None:
@@ -586,6 +726,11 @@ class Difficulties(Menu):
 
         # buttons
         self.buttons.extend([
+            Menu.Button(
+                text='chaos',
+                function=self.chaos,
+                font=self.font
+            ),  # chaos
             Menu.Button(
                 text='hard',
                 function=self.hard,
@@ -607,49 +752,32 @@ class Difficulties(Menu):
         for button in self.buttons:
             button.update()
 
-    def hard(self) -> None:
-        """ change settings values to tweak speeds and stuff """
-        settings.BALL_SPEED = 6
-        settings.PADDLE_SPEED = 7
-        settings.POWERUP_SPEED = 5
-        settings.POWERUP_BIG_PADLLE_DURATION = 5
-        settings.BALL_MULTIPLYER = 1
-        settings.MAX_BOUNCE_ANGLE = 120
-        settings.POWERUP_PADDLE_CHANCE = 7
-        settings.POWERUP_BALL_CHANCE = 3
-        settings.POWERUP_PADDLE_SIZE = 1.1
+    def apply(self, name: str) -> None:
+        """ use a settings.DIFFICULTIES preset in the next matches """
+        self.game.config = self.game.config.with_difficulty(name)
+        self.game.difficulty = name
         self.exit_state()
 
+    def hard(self) -> None:
+        """ faster ball, steeper bounces """
+        self.apply('hard')
+
     def normal(self) -> None:
-        """ change settings values to tweak speeds and stuff """
-        settings.BALL_SPEED = 5
-        settings.PADDLE_SPEED = 8
-        settings.POWERUP_SPEED = 2
-        settings.POWERUP_BIG_PADLLE_DURATION = 10
-        settings.BALL_MULTIPLYER = 2
-        settings.MAX_BOUNCE_ANGLE = 60
-        settings.POWERUP_PADDLE_CHANCE = 10
-        settings.POWERUP_BALL_CHANCE = 10
-        settings.POWERUP_PADDLE_SIZE = 1.2
-        self.exit_state()
+        """ the default speeds """
+        self.apply('normal')
 
     def easy(self) -> None:
-        """ change settings values to tweak speeds and stuff """
-        settings.BALL_SPEED = 4
-        settings.PADDLE_SPEED = 8
-        settings.POWERUP_SPEED = 1
-        settings.POWERUP_BIG_PADLLE_DURATION = 15
-        settings.BALL_MULTIPLYER = 3
-        settings.MAX_BOUNCE_ANGLE = 45
-        settings.POWERUP_PADDLE_CHANCE = 25
-        settings.POWERUP_BALL_CHANCE = 15
-        settings.POWERUP_PADDLE_SIZE = 1.4
-        self.exit_state()
+        """ slower ball, more powerups """
+        self.apply('easy')
+
+    def chaos(self) -> None:
+        """ normal speeds, but every paddle hit spawn more balls """
+        self.apply('chaos')
 
 
 class Resolution(Menu):
-    """ change settings.WIDTH and settings.HEIGHT.
-    Also toggle fullscreen
+    """ change settings.WIDTH and settings.HEIGHT, the size of the menus,
+    and the field of the next matches. Also toggle fullscreen
     """
 
     def __init__(self, game) -> None:
@@ -703,6 +831,17 @@ class Resolution(Menu):
             settings.WIDTH, settings.HEIGHT = self.game.display.get_size()
             self.game.fullscreen = True
 
+        self.resolution_changed()
+
+    def resolution_changed(self) -> None:
+        """ update the labels and rebuild the images for the new display """
+        self.game.config = self.game.config.resized(settings.WIDTH, settings.HEIGHT)
+
+        # converted and scaled images and the glyph atlases depend on the display,
+        # rebuild them now so the next state transitions don't have to
+        assets.invalidate()
+        assets.preload()
+
         # update labels for every Menu state in the stack
         self.update_labels()
 
@@ -721,7 +860,7 @@ class Resolution(Menu):
         self.game.display = pygame.display.set_mode(size=(512, 256))
         settings.WIDTH, settings.HEIGHT = 512, 256
 
-        self.update_labels()
+        self.resolution_changed()
 
     def res_1024x512(self) -> None:
         """ recreate the pygame display at a given size
@@ -730,4 +869,4 @@ class Resolution(Menu):
         self.game.display = pygame.display.set_mode(size=(1024, 512))
         settings.WIDTH, settings.HEIGHT = 1024, 512
 
-        self.update_labels()
+        self.resolution_changed()
@@ -0,0 +1,229 @@
+""" difficulty tuning sweeps.
+Play headless matches between scripted players for many sets of settings
+and report how they play : rally length, goals per minute and how balanced
+the wins are. Every set is a MatchConfig, the sets are spread on every core.
+The results are cached in settings.SWEEP_CACHE_DIR by a hash of the set
+and of the sweep options, a sweep run again only play the new sets.
+
+python sweep.py : the settings.DIFFICULTIES presets
+python sweep.py --grid BALL_SPEED=4,5,6 --grid MAX_BOUNCE_ANGLE=45,60 [--base normal]
+python sweep.py --random 20 --range BALL_SPEED=3:9 --range PADDLE_SPEED=5:10
+"""
+from collections.abc import Callable
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+import settings
+from config import MatchConfig
+from simulation import Match
+from inputs import Action
+
+# bump to ignore the cached results, when the simulation or the metrics change
+VERSION = 2
+
+
+def scripted(paddle_index: int, skill: float, seed: int) -> Callable[[Match], int]:
+    """ follow the ball like simulation.follow_ball, with human flaws.
+    skill is between 0 and 1 : the action change only with a probability skill
+    each tick (a reaction time), and the paddle aim off the ball center by up
+    to (1 - skill) paddle height, drawn again each time the ball turn back.
+    """
+    rng = random.Random(seed)
+    action = 0
+    aim = 0.0
+    going_right: bool | None = None
+
+    def controller(match: Match) -> int:
+        nonlocal action, aim, going_right
+        paddle = match.paddles[paddle_index]
+        ball = match.ball
+        # the bounces on the walls change the direction too, not its sign
+        if (ball.direction.x > 0) != going_right:
+            going_right = ball.direction.x > 0
+            aim = rng.uniform(-1, 1) * (1 - skill) * paddle.frect.height
+        if rng.random() < skill:
+            offset = ball.frect.centery + aim - paddle.frect.centery
+            if offset < -paddle.speed:
+                action = Action.UP
+            elif offset > paddle.speed:
+                action = Action.DOWN
+            else:
+                action = 0
+        return action
+
+    return controller
+
+
+def evaluate(
+    parameters: dict[str, Any],
+    matches: int,
+    max_ticks: int,
+    skills: tuple[float, float],
+) -> dict[str, float]:
+    """ play the matches with these settings, return the metrics.
+    The rally hits are the Match.paddle_hits, the bounces on the walls don't count.
+    """
+    config = MatchConfig.from_settings().with_settings(parameters)
+    ticks = goals = hits = left_wins = right_wins = 0
+    for seed in range(matches):
+        match = Match(seed=seed, config=config)
+        controllers = [
+            scripted(index, skill, seed * 2 + index) for index, skill in enumerate(skills)
+        ]
+        while match.winner is None and match.ticks < max_ticks:
+            match.step([controller(match) for controller in controllers])
+        ticks += match.ticks
+        hits += match.paddle_hits
+        goals += match.score.left + match.score.right
+        left_wins += match.winner == 'LEFT'
+        right_wins += match.winner == 'RIGHT'
+
+    seconds = ticks / settings.REFERENCE_HZ
+    minutes = seconds / 60
+    decided = left_wins + right_wins
+    return {
+        'rally_hits': hits / goals if goals else float(hits),
+        'rally_seconds': seconds / goals if goals else seconds,
+        'goals_per_minute': goals / minutes if minutes else 0.0,
+        'left_win_rate': left_wins / decided if decided else 0.5,
+        'unfinished': (matches - decided) / matches,
+    }
+
+
+def cache_path(parameters: dict[str, Any], options: dict[str, Any]) -> str:
+    """ where the result of a set is cached """
+    key = json.dumps([VERSION, sorted(parameters.items()), sorted(options.items())])
+    return os.path.join(settings.SWEEP_CACHE_DIR, hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+
+def sweep(
+    sets: list[dict[str, Any]],
+    matches: int,
+    max_ticks: int,
+    skills: tuple[float, float],
+    workers: int | None = None,
+) -> list[dict[str, float]]:
+    """ the metrics of every set, from the cache or played on every core """
+    options = {'matches': matches, 'max_ticks': max_ticks, 'skills': list(skills)}
+    results: list[dict[str, float] | None] = []
+    for parameters in sets:
+        path = cache_path(parameters, options)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                results.append(json.load(file))
+        else:
+            results.append(None)
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if missing:
+        os.makedirs(settings.SWEEP_CACHE_DIR, exist_ok=True)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            played = pool.map(
+                evaluate,
+                [sets[index] for index in missing],
+                itertools.repeat(matches),
+                itertools.repeat(max_ticks),
+                itertools.repeat(skills),
+            )
+            for index, result in zip(missing, played):
+                results[index] = result
+                with open(cache_path(sets[index], options), 'w', encoding='utf-8') as file:
+                    json.dump(result, file)
+    print(f'{len(sets) - len(missing)} sets cached, {len(missing)} played')
+    return [result for result in results if result is not None]
+
+
+def parse_values(text: str) -> int | float | bool:
+    """ a setting value from the command line """
+    if text in ('True', 'False'):
+        return text == 'True'
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def parameter_sets(arguments: argparse.Namespace) -> tuple[list[dict[str, Any]], list[str]]:
+    """ the sets to sweep and the names of the swept settings,
+    ['preset'] when the presets themselves are swept
+    """
+    base = settings.DIFFICULTIES[arguments.base]
+    if arguments.random:
+        ranges = {}
+        for option in arguments.range:
+            name, _, bounds = option.partition('=')
+            low, _, high = bounds.partition(':')
+            ranges[name] = (parse_values(low), parse_values(high))
+        rng = random.Random(arguments.seed)
+        sets = []
+        for _ in range(arguments.random):
+            drawn: dict[str, Any] = {}
+            for name, (low, high) in ranges.items():
+                if isinstance(low, int) and isinstance(high, int):
+                    drawn[name] = rng.randint(low, high)
+                else:
+                    drawn[name] = round(rng.uniform(low, high), 3)
+            sets.append({**base, **drawn})
+        return sets, list(ranges)
+    if arguments.grid:
+        grid = {}
+        for option in arguments.grid:
+            name, _, values = option.partition('=')
+            grid[name] = [parse_values(value) for value in values.split(',')]
+        sets = [{**base, **dict(zip(grid, values))} for values in itertools.product(*grid.values())]
+        return sets, list(grid)
+    return list(settings.DIFFICULTIES.values()), ['preset']
+
+
+def main() -> None:
+    """ build the sets, sweep, print a table """
+    parser = argparse.ArgumentParser(description='difficulty tuning sweep')
+    parser.add_argument('--base', default='normal', choices=settings.DIFFICULTIES,
+                        help='preset the swept settings are changed from')
+    parser.add_argument('--grid', action='append', default=[], metavar='NAME=V1,V2',
+                        help='every combination of the values')
+    parser.add_argument('--range', action='append', default=[], metavar='NAME=LOW:HIGH',
+                        help='with --random, drawn uniformly')
+    parser.add_argument('--random', type=int, help='number of random sets')
+    parser.add_argument('--matches', type=int, default=20, help='per set')
+    parser.add_argument('--max-ticks', type=int, default=60 * 60 * 10, help='per match')
+    parser.add_argument('--skills', default='0.2,0.2',
+                        help='skill of the left and right player, 0 to 1')
+    parser.add_argument('--workers', type=int, help='processes, every core by default')
+    parser.add_argument('--seed', type=int, default=0, help='of the random sets')
+    parser.add_argument('--output', help='write the sets and their metrics to this json file')
+    arguments = parser.parse_args()
+
+    sets, names = parameter_sets(arguments)
+
+    skills = tuple(float(skill) for skill in arguments.skills.split(','))
+    assert len(skills) == 2, '--skills take two values'
+    results = sweep(
+        sets, arguments.matches, arguments.max_ticks, (skills[0], skills[1]), arguments.workers,
+    )
+
+    labels = list(settings.DIFFICULTIES) if names == ['preset'] else None
+    columns = ['rally_hits', 'rally_seconds', 'goals_per_minute', 'left_win_rate', 'unfinished']
+    widths = [max(10, len(name) + 2) for name in names + columns]
+    print(''.join(f'{name:>{width}}' for name, width in zip(names + columns, widths)))
+    for index, (parameters, result) in enumerate(zip(sets, results)):
+        values = [labels[index]] if labels else [parameters[name] for name in names]
+        values += [f'{result[column]:.2f}' for column in columns]
+        print(''.join(f'{value:>{width}}' for value, width in zip(values, widths)))
+
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as file:
+            json.dump(
+                [{'settings': parameters, **result} for parameters, result in zip(sets, results)],
+                file,
+                indent=1,
+            )
+
+
+if __name__ == '__main__':
+    main()